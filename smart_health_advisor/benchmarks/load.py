@@ -0,0 +1,105 @@
+"""Concurrent "Mark ... as done" load generator.
+
+Simulates Streamlit sessions the way the server runs them: one thread per
+session, all sharing one HealthAdvisor (and so one connection pool and
+write-behind queue). Each simulated click records an exercise and then
+re-reads the Progress Tracker data, as the tab does after a write. Reports click latency percentiles,
+throughput and how many clicks failed with a database error. The rows it adds
+are removed again afterwards, so a seeded database stays reusable.
+
+    python benchmarks/load.py --sessions 50 --seconds 20
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from health_advisor import rollups  # noqa: E402
+from health_advisor.core import HealthAdvisor  # noqa: E402
+
+import seed  # noqa: E402
+from timing import summarize  # noqa: E402
+
+
+def _session(advisor, user_ids, exercises, deadline, think, rng, latencies, errors):
+    while time.perf_counter() < deadline:
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        try:
+            advisor.record_exercise(user_id, rng.choice(exercises))
+            advisor.exercises_on(user_id)
+            advisor.history(user_id, "7 days")
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+        else:
+            latencies.append(time.perf_counter() - start)
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+
+
+def _undo(pool, after_id):
+    """Delete daily_track rows with id > ``after_id`` and take them back out of the rollups."""
+    with pool.transaction() as conn:
+        deltas = {(u, d): (-cal, -n) for u, d, cal, n in conn.execute(
+            "SELECT user_id, day, SUM(calories), COUNT(*) FROM daily_track WHERE id>? GROUP BY user_id, day",
+            (after_id,))}
+        rollups.apply_many(conn, deltas)
+        conn.execute("DELETE FROM daily_rollup WHERE exercises=0")
+        conn.execute("DELETE FROM period_rollup WHERE exercises=0")
+        conn.execute("DELETE FROM daily_track WHERE id>?", (after_id,))
+
+
+def run(path, sessions=50, seconds=20.0, think=0.05, pool_size=8, users=None, seed_value=0):
+    """Drive ``sessions`` concurrent clickers against ``path`` for ``seconds``."""
+    advisor = HealthAdvisor.open(path, pool_size)
+    try:
+        max_id = advisor.pool.execute("SELECT MAX(id) FROM users")[0][0] or 0
+        user_ids = list(range(1, min(max_id, users or max_id) + 1))
+        exercises = sorted(advisor.catalog.exercises)
+        last_id = advisor.pool.execute("SELECT COALESCE(MAX(id), 0) FROM daily_track")[0][0]
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        threads = [threading.Thread(target=_session, daemon=True,
+                                    args=(advisor, user_ids, exercises, deadline, think,
+                                          random.Random(seed_value * 1000 + i), latencies, errors))
+                   for i in range(sessions)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        advisor.flush()
+        _undo(advisor.pool, last_id)
+    finally:
+        advisor.close()
+    result = summarize(latencies)
+    result.update(sessions=sessions, pool_size=pool_size, seconds=round(elapsed, 3),
+                  clicks_per_sec=round(len(latencies) / elapsed, 1), errors=len(errors),
+                  error_samples=sorted(set(errors))[:5])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database to load (default: a cached seeded database)")
+    parser.add_argument("--users", type=int, default=seed.USERS)
+    parser.add_argument("--rows", type=int, default=seed.ROWS)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--think", type=float, default=0.05, help="mean pause between clicks per session (s)")
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args(argv)
+    path = args.db or seed.ensure(args.users, args.rows)
+    print(json.dumps(run(path, args.sessions, args.seconds, args.think, args.pool_size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Time runs of smart_health_advisor.py through Streamlit's AppTest harness.
+
+Runs in its own process (run.py starts it with HEALTH_ADVISOR_DB pointing at
+the seeded database) so every measurement starts from an empty Streamlit
+cache. Prints one JSON object:
+
+    cold_run        first run of the script (imports, pool, catalog, plan book)
+    rerun           full rerun with a profile filled in and the Profile tab open
+    open_tab        full rerun that opens the Workout tab
+    mark_done       Workout fragment rerun after a "Mark ... as done" click
+    progress_range  Progress fragment rerun after changing its range
+
+Only the script's own execution is timed: AppTest re-parses the script and
+polls for widget updates on every run, which a real server does not. AppTest
+also always reruns the whole script, so fragment reruns are read from the
+app's section timers (metrics are switched on for this process).
+
+    HEALTH_ADVISOR_DB=bench.db python benchmarks/rerun.py --reruns 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ["HEALTH_ADVISOR_METRICS"] = "1"
+
+from streamlit.runtime.scriptrunner import script_runner  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from health_advisor import metrics  # noqa: E402
+from seed import user_name  # noqa: E402
+from timing import summarize  # noqa: E402
+
+SCRIPT = os.path.join(ROOT, "smart_health_advisor.py")
+
+_exec = script_runner.exec_func_with_error_handling
+_last_exec = [0.0]
+
+
+def _timed_exec(func, ctx):
+    start = time.perf_counter()
+    try:
+        return _exec(func, ctx)
+    finally:
+        _last_exec[0] = time.perf_counter() - start
+
+
+script_runner.exec_func_with_error_handling = _timed_exec
+
+
+def _run(at, tab=None):
+    # AppTest can't click a tab; select it through its session state key.
+    if tab is not None:
+        at.session_state["active_tab"] = tab
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"script raised: {at.exception[0].message}")
+    return _last_exec[0]
+
+
+def _section_seconds(name):
+    return sum(hist.total for metric, labels, hist in metrics.registry.snapshot()
+               if metric == "health_advisor_section_seconds" and labels.get("section") == name)
+
+
+def _fragment(at, section, tab):
+    before = _section_seconds(section)
+    _run(at, tab)
+    return _section_seconds(section) - before
+
+
+def run(user, reruns=20, timeout=120):
+    at = AppTest.from_file(SCRIPT, default_timeout=timeout)
+    cold = _run(at)
+    at.text_input(key="profile_name").set_value(user)
+    _run(at)
+    warm = [_run(at) for _ in range(reruns)]
+    opened = []
+    for _ in range(reruns):
+        _run(at, "Profile & BMI")
+        opened.append(_run(at, "Workout Plan"))
+    done_keys = [b.key for b in at.button if str(b.key).startswith("done_")]
+    clicks = []
+    for i in range(reruns):
+        at.button(key=done_keys[i % len(done_keys)]).click()
+        clicks.append(_fragment(at, "workout", "Workout Plan"))
+    _run(at, "Progress Tracker")
+    ranges = []
+    for i in range(reruns):
+        at.radio(key="progress_range").set_value(["30 days", "7 days"][i % 2])
+        ranges.append(_fragment(at, "progress", "Progress Tracker"))
+    return {"cold_run": summarize([cold]), "rerun": summarize(warm), "open_tab": summarize(opened),
+            "mark_done": summarize(clicks), "progress_range": summarize(ranges)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", default=user_name(1), help="profile name to fill in")
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.user, args.reruns)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Benchmark suite: SQL paths, plan generation, script and fragment reruns and concurrent load.
+
+Seeds (or reuses) a synthetic database, runs every benchmark and writes the
+results as JSON. Given a baseline from an earlier run, each benchmark is
+compared against it using the limits in thresholds.json and the exit status
+is 1 if anything regressed.
+
+    python benchmarks/run.py --out results.json
+    python benchmarks/run.py --baseline results.json --out new.json
+    python benchmarks/run.py --quick           # small database, for CI
+
+The script-rerun benchmarks need streamlit installed; they are reported as
+skipped otherwise.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from health_advisor import nutrition  # noqa: E402
+from health_advisor.core import HealthAdvisor  # noqa: E402
+from health_advisor.dates import today  # noqa: E402
+
+import load  # noqa: E402
+import seed  # noqa: E402
+from timing import measure, summarize  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+THRESHOLDS_PATH = os.path.join(HERE, "thresholds.json")
+
+QUICK = {"users": 1_000, "rows": 100_000, "samples": 500, "reruns": 5, "load_seconds": 5.0}
+FULL = {"users": seed.USERS, "rows": seed.ROWS, "samples": 5_000, "reruns": 20, "load_seconds": 20.0}
+
+
+def _profiles(rng, n):
+    return [(rng.choice(nutrition.DIETS), rng.randint(10, 100), rng.choice(nutrition.GENDERS),
+             rng.choice(nutrition.ACTIVITY_LEVELS)) for _ in range(n)]
+
+
+def bench_queries(path, users, samples, rng):
+    advisor = HealthAdvisor.open(path)
+    day = today()
+    user_ids = [(rng.randint(1, users),) for _ in range(samples)]
+    try:
+        return {
+            "progress_today": measure(lambda u: advisor.exercises_on(u, day), user_ids),
+            "progress_7_days": measure(lambda u: advisor.history(u, "7 days", day), user_ids),
+            "progress_90_days_weekly": measure(lambda u: advisor.history(u, "90 days", day), user_ids),
+            "progress_1_year_monthly": measure(lambda u: advisor.history(u, "1 year", day), user_ids),
+        }
+    finally:
+        advisor.close()
+
+
+def bench_plans(samples, rng):
+    profiles = _profiles(rng, samples)
+    builds = []
+    for _ in range(3):
+        start = time.perf_counter()
+        nutrition._build_book()
+        builds.append(time.perf_counter() - start)
+    return {
+        "plan_book_build": summarize(builds),
+        "generate_diet_plan": measure(nutrition.generate_diet_plan, profiles),
+        "get_nutrition_goals": measure(nutrition.get_nutrition_goals, [p[1:] for p in profiles]),
+    }
+
+
+def bench_reruns(path, reruns):
+    if importlib.util.find_spec("streamlit") is None:
+        return {"script_rerun": {"skipped": "streamlit is not installed"}}
+    env = dict(os.environ, HEALTH_ADVISOR_DB=path)
+    advisor = HealthAdvisor.open(path)
+    last_id = advisor.pool.execute("SELECT COALESCE(MAX(id), 0) FROM daily_track")[0][0]
+    try:
+        out = subprocess.run([sys.executable, os.path.join(HERE, "rerun.py"), "--reruns", str(reruns)],
+                             env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    finally:
+        # Take the "Mark ... as done" clicks back out of the seeded database.
+        load._undo(advisor.pool, last_id)
+        advisor.close()
+    results = json.loads(out.strip().splitlines()[-1])
+    return {f"script_{name}": stats for name, stats in results.items()}
+
+
+def _meta(args, params, path):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "database": os.path.basename(path),
+        "params": dict(params, sessions=args.sessions),
+    }
+
+
+def compare(results, baseline, thresholds):
+    """Regressions of ``results`` against ``baseline``, as a list of dicts."""
+    default = thresholds.get("default", {})
+    regressions = []
+    for name, stats in results.items():
+        limits = dict(default, **thresholds.get("benchmarks", {}).get(name, {}))
+        metric = limits.get("metric", "p50_ms")
+        value = stats.get(metric)
+        if value is None:
+            continue
+        budget = limits.get("budget_ms")
+        if budget is not None and value > budget:
+            regressions.append({"benchmark": name, "metric": metric, "value": value, "budget_ms": budget})
+        if "max_errors" in limits and stats.get("errors", 0) > limits["max_errors"]:
+            regressions.append({"benchmark": name, "metric": "errors", "value": stats["errors"],
+                                "max_errors": limits["max_errors"]})
+        base = baseline.get(name, {}).get(metric)
+        if base is None:
+            continue
+        ratio = value / base if base else float("inf")
+        # Ignore differences below the noise floor of sub-millisecond timings.
+        if ratio > limits.get("max_ratio", 1.25) and value - base > limits.get("min_delta_ms", 0.05):
+            regressions.append({"benchmark": name, "metric": metric, "value": value, "baseline": base,
+                                "ratio": round(ratio, 3), "max_ratio": limits.get("max_ratio", 1.25)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small database and fewer samples")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions for the load test")
+    parser.add_argument("--only", help="comma-separated groups: queries,plans,rerun,load")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    params = dict(QUICK if args.quick else FULL)
+    params.update({k: v for k, v in (("users", args.users), ("rows", args.rows)) if v is not None})
+    groups = set(args.only.split(",")) if args.only else {"queries", "plans", "rerun", "load"}
+    rng = random.Random(args.seed)
+    path = seed.ensure(params["users"], params["rows"], seed_value=args.seed)
+
+    results = {}
+    if "queries" in groups:
+        results.update(bench_queries(path, params["users"], params["samples"], rng))
+    if "plans" in groups:
+        results.update(bench_plans(params["samples"], rng))
+    if "rerun" in groups:
+        results.update(bench_reruns(path, params["reruns"]))
+    if "load" in groups:
+        results["load_mark_done"] = load.run(path, args.sessions, params["load_seconds"], seed_value=args.seed)
+
+    report = {"meta": _meta(args, params, path), "benchmarks": results}
+    with open(args.thresholds, encoding="utf-8") as f:
+        thresholds = json.load(f)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline.get("meta")
+    # Budgets and error limits apply even without a baseline.
+    report["regressions"] = compare(results, baseline.get("benchmarks", {}), thresholds)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for r in report["regressions"]:
+        print("REGRESSION", json.dumps(r), file=sys.stderr)
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
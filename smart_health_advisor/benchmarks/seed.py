@@ -0,0 +1,140 @@
+"""Build synthetic benchmark databases.
+
+Every database is fully determined by (users, rows, days, seed) and the day
+its history ends on (the anchor, today by default), is migrated to the current
+schema and has its rollups built, so results from two runs on the same
+parameters are comparable. Files are cached under benchmarks/.data/ by those
+parameters and reused until the schema version or the anchor day changes;
+the copy for an earlier anchor is deleted when a new one is seeded.
+
+    python benchmarks/seed.py --users 10000 --rows 10000000
+"""
+import argparse
+import glob
+import os
+import random
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from health_advisor import catalog, rollups  # noqa: E402
+from health_advisor.dates import from_day_number, today  # noqa: E402
+from health_advisor.db import ConnectionPool  # noqa: E402
+from health_advisor.migrations import SCHEMA_VERSION, migrate  # noqa: E402
+from health_advisor.nutrition import ACTIVITY_LEVELS, DIETS, GENDERS  # noqa: E402
+from health_advisor.profiles import normalize_name  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+
+USERS = 10_000
+ROWS = 10_000_000
+DAYS = 365
+INSERT_BATCH = 200_000
+
+
+def user_name(i):
+    return f"bench-user-{i:06d}"
+
+
+def db_path(users=USERS, rows=ROWS, days=DAYS, seed=0, anchor=None):
+    # The history ends on the anchor day and the app reads it relative to
+    # today, so a file seeded yesterday is not the same benchmark.
+    anchor = from_day_number(today() if anchor is None else anchor).isoformat()
+    return os.path.join(DATA_DIR, f"bench-v{SCHEMA_VERSION}-{users}u-{rows}r-{days}d-s{seed}-{anchor}.db")
+
+
+def _profiles(rng, users):
+    for i in range(1, users + 1):
+        yield (i, user_name(i), normalize_name(user_name(i)), rng.randint(10, 100), rng.choice(GENDERS),
+               rng.choice(ACTIVITY_LEVELS), rng.choice(DIETS))
+
+
+def _tracking_rows(rng, users, rows, days, exercises, last):
+    """(user_id, day, exercise, calories) in (user_id, day) order, ending on day ``last``."""
+    per_user, extra = divmod(rows, users)
+    for user_id in range(1, users + 1):
+        count = per_user + (user_id <= extra)
+        for day in sorted(rng.choices(range(last - days + 1, last + 1), k=count)):
+            exercise, calories = rng.choice(exercises)
+            yield user_id, day, exercise, calories
+
+
+def seed(path, users=USERS, rows=ROWS, days=DAYS, seed=0, progress=None, anchor=None):
+    """Create the database at ``path`` with history ending on day ``anchor`` (default today), replacing any file."""
+    anchor = today() if anchor is None else anchor
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    pool = ConnectionPool(path, size=1)
+    migrate(pool)
+    pool.close()
+
+    rng = random.Random(seed)
+    exercises = sorted((ex, info["calories"]) for ex, info in catalog.current().exercises.items())
+    conn = sqlite3.connect(path, isolation_level=None)
+    # Throwaway data: skip durability while loading.
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO users (id, name, name_key, age, gender, activity, diet) VALUES (?,?,?,?,?,?,?)",
+                     _profiles(rng, users))
+    # Loading into a bare table and indexing afterwards is much faster than
+    # maintaining the index row by row.
+    conn.execute("DROP INDEX daily_track_user_day")
+    batch, done = [], 0
+    for row in _tracking_rows(rng, users, rows, days, exercises, anchor):
+        batch.append(row)
+        if len(batch) == INSERT_BATCH:
+            conn.executemany("INSERT INTO daily_track (user_id, day, exercise, calories) VALUES (?,?,?,?)", batch)
+            done += len(batch)
+            batch.clear()
+            if progress:
+                progress(done)
+    conn.executemany("INSERT INTO daily_track (user_id, day, exercise, calories) VALUES (?,?,?,?)", batch)
+    conn.execute("CREATE INDEX daily_track_user_day ON daily_track(user_id, day, completed, exercise, calories)")
+    rollups._rebuild(conn)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def ensure(users=USERS, rows=ROWS, days=DAYS, seed_value=0, verbose=True, anchor=None):
+    """Path of a cached database for these parameters, seeding it first if needed."""
+    anchor = today() if anchor is None else anchor
+    path = db_path(users, rows, days, seed_value, anchor)
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    start = time.perf_counter()
+    tmp = path + ".tmp"
+
+    def progress(done):
+        if verbose:
+            print(f"  seeded {done:,}/{rows:,} rows ({time.perf_counter() - start:.0f}s)", end="\r", flush=True)
+
+    seed(tmp, users, rows, days, seed_value, progress, anchor)
+    os.replace(tmp, path)
+    for stale in glob.glob(path.rsplit("-", 3)[0] + "-????-??-??.db"):
+        if stale != path:
+            os.remove(stale)
+    if verbose:
+        print(f"seeded {path} in {time.perf_counter() - start:.0f}s" + " " * 20)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(ensure(args.users, args.rows, args.days, args.seed))
+
+
+if __name__ == '__main__':
+    main()
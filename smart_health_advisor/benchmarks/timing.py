@@ -0,0 +1,44 @@
+"""Timing helpers shared by the benchmark scripts. All figures are milliseconds."""
+import gc
+import time
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(seconds):
+    """Latency summary of a list of durations in seconds."""
+    ordered = sorted(s * 1000 for s in seconds)
+    if not ordered:
+        return {"n": 0}
+    return {
+        "n": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 4),
+        "p50_ms": round(_percentile(ordered, 0.50), 4),
+        "p95_ms": round(_percentile(ordered, 0.95), 4),
+        "p99_ms": round(_percentile(ordered, 0.99), 4),
+        "max_ms": round(ordered[-1], 4),
+    }
+
+
+def measure(func, args, warmup=10):
+    """Call ``func(*a)`` for every ``a`` in ``args`` (after ``warmup`` untimed calls) and summarize."""
+    args = list(args)
+    for a in args[:warmup]:
+        func(*a)
+    durations = []
+    gc_was_enabled = gc.isenabled()
+    # Keep collector pauses out of per-call timings.
+    gc.disable()
+    try:
+        for a in args:
+            start = time.perf_counter()
+            func(*a)
+            durations.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return summarize(durations)
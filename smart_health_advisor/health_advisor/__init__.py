@@ -0,0 +1 @@
+"""Core building blocks for the Smart Health Advisor app."""
@@ -0,0 +1,304 @@
+"""Asyncio JSON HTTP API over health_advisor.core, for mobile and other clients.
+
+Built on asyncio streams only (no web framework). Connections are kept alive.
+Plan and catalog lookups are served on the event loop. Database work runs on
+a thread pool the same size as the connection pool, so the loop never blocks
+on SQLite.
+
+    python -m health_advisor.api --port 8080 --db health_advisor.db
+
+Routes (names are URL-encoded path segments). GETs for a name that has never
+saved a profile or tracked an exercise answer 404; they don't create the user.
+
+    GET  /health
+    GET  /users/{name}/profile
+    PUT  /users/{name}/profile        {"age", "gender", "activity", "diet", "medical_conditions"?: [...]}
+    GET  /users/{name}/today
+    POST /users/{name}/tracking       {"exercise", "date"?: "YYYY-MM-DD", "token"?}
+    GET  /users/{name}/stats?view=7 days
+    GET  /users/{name}/program        precomputed by health_advisor.programs
+    GET  /plans/diet?diet=&age=&gender=&activity=
+    GET  /plans/workout?age=
+    GET  /conditions?kind=medical_exercises&q=&limit=&offset=
+    GET  /conditions/{kind}/{condition}
+    GET  /metrics                     Prometheus text (HEALTH_ADVISOR_METRICS=1)
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import functools
+import json
+import logging
+import re
+import sqlite3
+import time
+import urllib.parse
+from http import HTTPStatus
+
+from . import metrics
+from .core import NotFound, HealthAdvisor
+from .dates import day_number, from_day_number
+from .db import DB_PATH
+
+log = logging.getLogger(__name__)
+
+MAX_BODY = 64 * 1024
+# "/users/([^/]+)/today" -> "/users/{}/today" for metric labels.
+_ROUTE_LABEL = re.compile(r"\(\[\^/\]\+\)")
+# Seconds an idle keep-alive connection stays open.
+IDLE_TIMEOUT = 30
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_arg(query, name, default=None, minimum=None):
+    value = query.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer") from None
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+
+def _plan_json(plan):
+    return {"calories": plan.calories, "protein": plan.protein, "score": round(plan.score, 4),
+            "meals": [dict(meal) for meal in plan.meals]}
+
+
+class API:
+    """Routes requests to a HealthAdvisor."""
+
+    def __init__(self, advisor):
+        self.advisor = advisor
+        self.executor = concurrent.futures.ThreadPoolExecutor(advisor.pool.size, thread_name_prefix="api-db")
+        self.routes = []
+        for method, pattern, handler in (
+            ("GET", r"/health", self.health),
+            ("GET", r"/users/([^/]+)/profile", self.get_profile),
+            ("PUT", r"/users/([^/]+)/profile", self.put_profile),
+            ("GET", r"/users/([^/]+)/today", self.get_today),
+            ("POST", r"/users/([^/]+)/tracking", self.post_tracking),
+            ("GET", r"/users/([^/]+)/stats", self.get_stats),
+            ("GET", r"/users/([^/]+)/program", self.get_program),
+            ("GET", r"/plans/diet", self.get_diet_plan),
+            ("GET", r"/plans/workout", self.get_workout_plan),
+            ("GET", r"/conditions", self.get_conditions),
+            ("GET", r"/conditions/([^/]+)/([^/]+)", self.get_condition),
+            ("GET", r"/metrics", self.get_metrics),
+        ):
+            self.routes.append((method, re.compile(pattern + "$"), handler))
+
+    async def _db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def dispatch(self, method, path, query, body):
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            args = [urllib.parse.unquote(g) for g in match.groups()]
+            if not metrics.ENABLED:
+                return await handler(*args, query=query, body=body)
+            start = time.perf_counter()
+            try:
+                return await handler(*args, query=query, body=body)
+            finally:
+                metrics.registry.observe("health_advisor_http_seconds", time.perf_counter() - start,
+                                         route=f"{method} {_ROUTE_LABEL.sub('{}', pattern.pattern[:-1])}")
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"no route for {path}")
+
+    # -- handlers -------------------------------------------------------------
+
+    async def health(self, query, body):
+        return {"status": "ok", "catalog": self.advisor.catalog.version}
+
+    async def get_profile(self, name, query, body):
+        return await self._db(self.advisor.profile, name)
+
+    async def put_profile(self, name, query, body):
+        conditions = body.get("medical_conditions")
+        if isinstance(conditions, str):
+            conditions = [c.strip() for c in conditions.replace(";", ",").split(",") if c.strip()]
+        user_id = await self._db(self.advisor.save_profile, name, body.get("age"), body.get("gender"),
+                                 body.get("activity"), body.get("diet"), conditions)
+        return {"user_id": user_id, **await self._db(self.advisor.profile, name)}
+
+    async def get_today(self, name, query, body):
+        user_id = await self._db(self.advisor.user_id, name)
+        rows = await self._db(self.advisor.exercises_on, user_id)
+        return {"exercises": [{"exercise": ex, "calories": cal} for ex, cal in rows],
+                "calories": sum(cal for _, cal in rows)}
+
+    async def post_tracking(self, name, query, body):
+        # Validate before user_id(create=True) so a rejected write leaves no user behind.
+        self.advisor.check_write(body.get("exercise"), body.get("token"))
+        day = None
+        if body.get("date") is not None:
+            day = day_number(datetime.date.fromisoformat(str(body["date"])))
+        user_id = await self._db(self.advisor.user_id, name, True)
+        calories = await self._db(self.advisor.record_exercise, user_id, body.get("exercise"), day,
+                                  body.get("token"))
+        return {"user_id": user_id, "exercise": body.get("exercise"), "calories": calories,
+                "duplicate": calories is None}
+
+    async def get_stats(self, name, query, body):
+        user_id = await self._db(self.advisor.user_id, name)
+        rows = await self._db(self.advisor.history, user_id, query.get("view", "7 days"))
+        return {"view": query.get("view", "7 days"),
+                "buckets": [{"start": from_day_number(day).isoformat(), "calories": cal, "exercises": n}
+                            for day, cal, n in rows]}
+
+    async def get_program(self, name, query, body):
+        user_id = await self._db(self.advisor.user_id, name)
+        program = await self._db(self.advisor.program, user_id)
+        if program is None:
+            raise NotFound(f"no program for {name!r} yet")
+        for week in program["weeks"]:
+            week["start"] = from_day_number(week["start_day"]).isoformat()
+        return {"user_id": user_id, **program}
+
+    async def get_diet_plan(self, query, body):
+        plans, cal_goal, prot_goal = self.advisor.diet_plans(query.get("diet"), _int_arg(query, "age"),
+                                                              query.get("gender"), query.get("activity"))
+        return {"calorie_goal": cal_goal, "protein_goal": prot_goal, "plans": [_plan_json(p) for p in plans]}
+
+    async def get_workout_plan(self, query, body):
+        age = _int_arg(query, "age")
+        return {"exercises": [{"exercise": ex, "sets_reps": sets_reps, "level": info["level"],
+                               "muscles": info["muscles"], "calories": info["calories"]}
+                              for ex, info, sets_reps in self.advisor.workout_plan(age)]}
+
+    async def get_conditions(self, query, body):
+        page = self.advisor.search_conditions(query.get("kind", "medical_exercises"), query.get("q", ""),
+                                              _int_arg(query, "limit", 20, 0), _int_arg(query, "offset", 0, 0))
+        return {"names": list(page.names), "total": page.total, "offset": page.offset}
+
+    async def get_condition(self, kind, condition, query, body):
+        if kind == "medical_exercises":
+            return {"condition": condition, "exercises": list(self.advisor.medical_exercises(condition))}
+        if kind == "medical_diet":
+            advice = self.advisor.medical_diet(condition)
+            return {"condition": condition, "eat": list(advice["eat"]), "avoid": list(advice["avoid"])}
+        raise NotFound(f"unknown kind {kind!r}")
+
+    async def get_metrics(self, query, body):
+        if not metrics.ENABLED:
+            raise NotFound("metrics are off; set HEALTH_ADVISOR_METRICS=1")
+        return metrics.prometheus_text()
+
+    # -- HTTP plumbing ------------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line, reader, writer):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request line"}, False)
+            return False
+        keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        content_length = headers.get("content-length") or "0"
+        if not (content_length.isascii() and content_length.isdigit()):
+            self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "invalid Content-Length"}, False)
+            return False
+        length = int(content_length)
+        if length > MAX_BODY:
+            self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}, False)
+            return False
+        raw = await reader.readexactly(length) if length else b""
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            body = json.loads(raw) if raw else {}
+            if not isinstance(body, dict):
+                raise ValueError("body must be a JSON object")
+            status, payload = HTTPStatus.OK, await self.dispatch(method, url.path, query, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except NotFound as e:
+            status, payload = HTTPStatus.NOT_FOUND, {"error": str(e)}
+        except ValueError as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except sqlite3.OperationalError as e:
+            # Pool exhausted or the database stayed locked past the busy timeout.
+            status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"error": f"database busy: {e}"}
+        except Exception:
+            log.exception("%s %s failed", method, target)
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+        self._respond(writer, status, payload, keep_alive)
+        return keep_alive
+
+    @staticmethod
+    def _respond(writer, status, payload, keep_alive):
+        # Handlers return JSON-able objects, or str for plain text (/metrics).
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode(), "application/json; charset=utf-8"
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m health_advisor.api", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--pool-size", type=int, default=8, help="database connections (and DB worker threads)")
+    args = parser.parse_args(argv)
+    advisor = HealthAdvisor.open(args.db, args.pool_size)
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(API(advisor).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        advisor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""URLs for the optimized exercise models and posters built by tools/build_assets.py.
+
+The asset pipeline writes compressed GLBs and poster images to static/models/
+together with manifest.json, which maps each catalog ``animation`` path to
+its served URLs. Every URL carries a ``?v=<content hash>`` query, so a rebuilt
+asset gets a new URL. Streamlit itself sends no cache headers for static
+files; run the app through serve.py to mark these URLs immutable for a year.
+"""
+import json
+import os
+import threading
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+MANIFEST_PATH = os.path.join(STATIC_DIR, 'models', 'manifest.json')
+
+_lock = threading.Lock()
+_cached = (None, {})
+
+
+def _manifest():
+    global _cached
+    try:
+        stamp = os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return {}
+    if _cached[0] != stamp:
+        with _lock:
+            if _cached[0] != stamp:
+                with open(MANIFEST_PATH, encoding='utf-8') as f:
+                    _cached = (stamp, json.load(f))
+    return _cached[1]
+
+
+def model_assets(animation):
+    """(model URL, poster URL or None) for a catalog ``animation`` path.
+
+    Falls back to the raw path when the pipeline has not been run.
+    """
+    entry = _manifest().get(animation)
+    if entry is None:
+        return animation, None
+    return entry["model"], entry.get("poster")
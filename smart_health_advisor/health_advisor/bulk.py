@@ -0,0 +1,339 @@
+"""Streaming bulk import and export of exercise tracking data.
+
+Import reads CSV (with a header row, one record per line) or JSON Lines in
+fixed-size batches, so memory stays bounded whatever the file size. Each row needs ``name``,
+``exercise`` and ``date`` (YYYY-MM-DD); ``calories`` is optional and defaults
+to the catalog value. Exercises must exist in the catalog. Every batch goes in
+as one transaction together with its rollup deltas and a checkpoint (the byte
+offset reached), so an interrupted import picks up where it stopped when it is
+run again on the same file. The checkpoint also records a hash of the file's
+first bytes; if the file at that path has been replaced, the import starts
+over instead of resuming. Lines that are not valid UTF-8 are rejected like any
+other bad row.
+
+Export writes daily_track joined with user names to CSV, or to Parquet when
+pyarrow is installed, a chunk at a time.
+
+    python -m health_advisor.bulk import history.csv [--rejects bad.csv]
+    python -m health_advisor.bulk export out.parquet [--since 2024-01-01]
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import itertools
+import json
+import operator
+import os
+import sys
+import time
+
+from . import catalog, rollups
+from .dates import day_number, from_day_number
+from .db import DB_PATH, ConnectionPool
+from .migrations import migrate
+from .profiles import normalize_name
+
+BATCH_ROWS = 50_000
+BULK_CACHE_SIZE = -262_144  # KiB, i.e. 256 MB
+HEAD_BYTES = 65_536  # hashed to recognise the file behind a checkpoint
+EXPORT_CHUNK_ROWS = 100_000
+
+EXPORT_COLUMNS = ("name", "user_id", "exercise", "calories", "date")
+
+
+class ImportResult:
+    def __init__(self, source):
+        self.source = source
+        self.imported = 0
+        self.rejected = 0
+        self.resumed_at = 0
+        self.resumed_rows = 0
+        self.restarted = False
+        self.seconds = 0.0
+
+    def __repr__(self):
+        rate = (self.imported - self.resumed_rows) / self.seconds if self.seconds else 0
+        restarted = ", restarted (file changed)" if self.restarted else ""
+        return (f"ImportResult({self.source!r}, imported={self.imported}, rejected={self.rejected}, "
+                f"resumed_at={self.resumed_at}{restarted}, {rate:,.0f} rows/s)")
+
+
+def _file_format(path, fmt):
+    if fmt:
+        return fmt
+    return "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+
+FIELDS = ("name", "exercise", "calories", "date")
+
+
+class _Undecodable(str):
+    """The text (with replacement characters) of a line that is not valid UTF-8."""
+
+
+def _decode_batch(lines, fmt, header):
+    """Yield a (name, exercise, calories, date) tuple per line, or the raw text of a malformed line."""
+    if fmt == "csv":
+        # Columns missing from the header read as None via an extra trailing cell.
+        width = len(header)
+        pick = operator.itemgetter(*(header.index(f) if f in header else width for f in FIELDS))
+        texts = []
+        for line in lines:
+            try:
+                texts.append(line.decode("utf-8"))
+            except UnicodeDecodeError:
+                yield _Undecodable(line.decode("utf-8", "replace"))
+        for row in csv.reader(texts):
+            if not row:
+                continue
+            if len(row) != width:
+                yield ",".join(row)
+                continue
+            row.append(None)
+            yield pick(row)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield tuple(record.get(f) for f in FIELDS)
+        except UnicodeDecodeError:
+            yield _Undecodable(line.decode("utf-8", "replace"))
+        except (ValueError, AttributeError):
+            yield line.decode("utf-8", "replace")
+
+
+class _Importer:
+    def __init__(self, pool, exercises, rejects):
+        self.pool = pool
+        self.calories = {ex: info["calories"] for ex, info in exercises.items()}
+        self.rejects = rejects
+        self.user_ids = {}  # name_key -> users.id
+        self.keys = {}  # name as written -> name_key
+        self.days = {}
+
+    def _day(self, value):
+        day = self.days[value] = day_number(datetime.date.fromisoformat(str(value)))
+        return day
+
+    def _reject(self, record, reason):
+        if self.rejects is not None:
+            row = dict(zip(FIELDS, record)) if isinstance(record, tuple) else record
+            self.rejects.write(json.dumps({"reason": reason, "row": row}, default=str) + "\n")
+
+    def _resolve_users(self, conn, names):
+        """Map every name to a users.id in self.user_ids (via self.keys), creating users as needed."""
+        spelling = {}
+        for name in names:
+            key = self.keys.get(name)
+            if key is None:
+                key = self.keys[name] = normalize_name(name)
+            if key not in self.user_ids:
+                spelling.setdefault(key, " ".join(name.split()))
+        missing = list(spelling)
+        for chunk in range(0, len(missing), 500):
+            part = missing[chunk:chunk + 500]
+            marks = ",".join("?" * len(part))
+            for key, user_id in conn.execute(f"SELECT name_key, id FROM users WHERE name_key IN ({marks})", part):
+                self.user_ids[key] = user_id
+        new = [k for k in missing if k not in self.user_ids]
+        if new:
+            first = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
+            conn.executemany("INSERT INTO users (id, name, name_key) VALUES (?,?,?)",
+                             [(user_id, spelling[key], key) for user_id, key in enumerate(new, first)])
+            self.user_ids.update((key, user_id) for user_id, key in enumerate(new, first))
+
+    def load_batch(self, conn, records):
+        """Validate and insert one batch; returns (imported, rejected)."""
+        rows, rejected = [], 0
+        default_calories, days = self.calories, self.days
+        for record in records:
+            if not isinstance(record, tuple):
+                self._reject(record, "invalid UTF-8" if isinstance(record, _Undecodable) else "malformed line")
+                rejected += 1
+                continue
+            name, exercise, calories, date = record
+            # JSON lines can hold any type; check before the dict and set
+            # lookups below, which need strings.
+            if not isinstance(name, str) or not name.strip():
+                reason = "missing name" if isinstance(name, str) or name is None else "name must be a string"
+                self._reject(record, reason)
+                rejected += 1
+                continue
+            if not isinstance(exercise, str) or exercise not in default_calories:
+                self._reject(record, "unknown exercise")
+                rejected += 1
+                continue
+            try:
+                day = days.get(date)
+                if day is None:
+                    day = self._day(date)
+                calories = default_calories[exercise] if calories is None or calories == "" else int(calories)
+                if calories < 0:
+                    raise ValueError("negative calories")
+            except (TypeError, ValueError) as e:
+                self._reject(record, str(e))
+                rejected += 1
+                continue
+            rows.append((name, day, exercise, calories))
+        self._resolve_users(conn, list({r[0] for r in rows}))
+        user_ids, keys = self.user_ids, self.keys
+        # Sorted by the index key, consecutive inserts land on the same b-tree
+        # pages instead of all over the index.
+        inserts = sorted([(user_ids[keys[name]], day, exercise, calories) for name, day, exercise, calories in rows])
+        conn.executemany("INSERT INTO daily_track (user_id,day,exercise,calories,completed) VALUES (?,?,?,?,1)",
+                         inserts)
+        deltas = {}
+        for user_id, day, _, calories in inserts:
+            key = (user_id, day)
+            prev = deltas.get(key)
+            deltas[key] = (calories, 1) if prev is None else (prev[0] + calories, prev[1] + 1)
+        rollups.apply_many(conn, deltas)
+        return len(inserts), rejected
+
+
+def import_file(pool, path, fmt=None, source=None, batch_rows=BATCH_ROWS, rejects=None, exercises=None):
+    """Import ``path`` into daily_track, resuming from its checkpoint if any."""
+    fmt = _file_format(path, fmt)
+    source = source or os.path.abspath(path)
+    result = ImportResult(source)
+    importer = _Importer(pool, exercises if exercises is not None else catalog.current().exercises, rejects)
+    start = time.perf_counter()
+    with pool.connection() as conn, open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+        head_sha256 = hashlib.sha256(head).hexdigest()
+        f.seek(0)
+        # A bigger page cache keeps the hot part of the indexes in memory
+        # across batches.
+        cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+        conn.execute(f"PRAGMA cache_size={BULK_CACHE_SIZE}")
+        try:
+            header = None
+            if fmt == "csv":
+                header = next(csv.reader([f.readline().decode("utf-8-sig")]), [])
+            row = conn.execute('''SELECT byte_offset, rows_imported, rows_rejected, head_bytes, head_sha256
+                FROM import_checkpoints WHERE source=?''', (source,)).fetchone()
+            if row:
+                offset, imported, rejected, hashed_bytes, hashed_sha256 = row
+                # The file may have grown since (an appended log), so only the
+                # bytes hashed back then are compared. Checkpoints written
+                # before hashes were recorded are trusted as they are.
+                if hashed_sha256 is None or (hashlib.sha256(head[:hashed_bytes]).hexdigest() == hashed_sha256
+                                             and os.fstat(f.fileno()).st_size >= offset):
+                    result.resumed_at, result.imported, result.rejected = offset, imported, rejected
+                    result.resumed_rows = result.imported
+                    f.seek(result.resumed_at)
+                else:
+                    result.restarted = True
+            while True:
+                lines = list(itertools.islice(f, batch_rows))
+                if not lines:
+                    break
+                offset = f.tell()
+                with pool.transaction() as conn:
+                    imported, rejected = importer.load_batch(conn, _decode_batch(lines, fmt, header))
+                    result.imported += imported
+                    result.rejected += rejected
+                    conn.execute('''INSERT INTO import_checkpoints (source, byte_offset, rows_imported, rows_rejected,
+                        updated_at, head_bytes, head_sha256) VALUES (?,?,?,?,?,?,?) ON CONFLICT (source) DO UPDATE
+                        SET byte_offset=excluded.byte_offset, rows_imported=excluded.rows_imported,
+                        rows_rejected=excluded.rows_rejected, updated_at=excluded.updated_at,
+                        head_bytes=excluded.head_bytes, head_sha256=excluded.head_sha256''',
+                                 (source, offset, result.imported, result.rejected,
+                                  datetime.datetime.now().isoformat(timespec="seconds"), len(head), head_sha256))
+        finally:
+            conn.execute(f"PRAGMA cache_size={cache_size}")
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def _export_query(user=None, since=None):
+    sql = ("SELECT u.name, t.user_id, t.exercise, t.calories, t.day FROM daily_track t "
+           "JOIN users u ON u.id = t.user_id WHERE t.completed=1")
+    params = []
+    if user is not None:
+        sql += " AND u.name_key=?"
+        params.append(normalize_name(user))
+    if since is not None:
+        sql += " AND t.day>=?"
+        params.append(day_number(since))
+    return sql + " ORDER BY t.id", params
+
+
+def _chunks(pool, user, since, chunk_rows):
+    sql, params = _export_query(user, since)
+    with pool.connection() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield [(name, user_id, ex, cal, from_day_number(day).isoformat()) for name, user_id, ex, cal, day in rows]
+
+
+def export(pool, path, fmt=None, user=None, since=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write tracking rows to ``path`` as CSV or Parquet; returns the row count."""
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv")
+    total = 0
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow") from None
+        schema = pa.schema([("name", pa.string()), ("user_id", pa.int64()), ("exercise", pa.string()),
+                            ("calories", pa.int64()), ("date", pa.string())])
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in _chunks(pool, user, since, chunk_rows):
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays([pa.array(c) for c in columns], schema=schema))
+                total += len(rows)
+        return total
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in _chunks(pool, user, since, chunk_rows):
+            writer.writerows(rows)
+            total += len(rows)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m health_advisor.bulk", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="load CSV/JSONL into daily_track")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=("csv", "jsonl"))
+    imp.add_argument("--batch", type=int, default=BATCH_ROWS, help="rows per transaction")
+    imp.add_argument("--rejects", help="write rejected rows here as JSON lines")
+    imp.add_argument("--source", help="checkpoint key (defaults to the absolute path)")
+    exp = sub.add_parser("export", help="write daily_track to CSV or Parquet")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=("csv", "parquet"))
+    exp.add_argument("--user", help="only this user's rows")
+    exp.add_argument("--since", type=datetime.date.fromisoformat, help="only rows on or after YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    pool = ConnectionPool(args.db, size=1)
+    migrate(pool)
+    if args.command == "import":
+        rejects = open(args.rejects, "a", encoding="utf-8") if args.rejects else None
+        try:
+            print(import_file(pool, args.path, args.format, args.source, args.batch, rejects))
+        finally:
+            if rejects is not None:
+                rejects.close()
+    else:
+        try:
+            total = export(pool, args.path, args.format, args.user, args.since)
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+        print(f"exported {total:,} rows to {args.path}")
+    pool.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
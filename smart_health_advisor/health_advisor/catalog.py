@@ -0,0 +1,127 @@
+"""Exercise, food and medical-condition catalogs, loaded from data/catalog.json.
+
+The file is parsed once per process into an immutable, indexed ``Catalog``
+snapshot that every session shares. ``current()`` re-checks the file at most
+once per second and swaps in a new snapshot when it changes, so edits to the
+catalog go live without restarting the app. Anything derived from a catalog
+can key its caches on ``Catalog.version`` (a hash of the file contents).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import types
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'catalog.json')
+
+# Layout version of catalog.json this module understands.
+FORMAT = 1
+
+log = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return types.MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _reject_duplicates(pairs):
+    seen = {}
+    for key, value in pairs:
+        if key in seen:
+            raise ValueError(f"duplicate catalog key {key!r}")
+        seen[key] = value
+    return seen
+
+
+def _index_by(entries, field):
+    index = {}
+    for name, info in entries.items():
+        index.setdefault(info[field], []).append(name)
+    return types.MappingProxyType({k: tuple(v) for k, v in index.items()})
+
+
+class Catalog:
+    """One immutable snapshot of catalog.json, with lookup indexes."""
+
+    def __init__(self, data, version):
+        if data.get("format") != FORMAT:
+            raise ValueError(f"unsupported catalog format {data.get('format')!r}, expected {FORMAT}")
+        self.version = version
+        self.exercises = _freeze(data["exercises"])
+        self.foods = _freeze(data["foods"])
+        self.medical_exercises = _freeze(data["medical_exercises"])
+        self.medical_diet = _freeze(data["medical_diet"])
+        self.exercises_by_category = _index_by(self.exercises, "category")
+        self.exercises_by_level = _index_by(self.exercises, "level")
+        self.foods_by_meal = _index_by(self.foods, "meal")
+        self.conditions = tuple(sorted(self.medical_exercises.keys() | self.medical_diet.keys()))
+        # Groups of words that condition search treats as the same word.
+        self.condition_synonyms = _freeze(data.get("condition_synonyms", []))
+
+    @classmethod
+    def from_bytes(cls, blob):
+        data = json.loads(blob, object_pairs_hook=_reject_duplicates)
+        return cls(data, hashlib.sha1(blob).hexdigest())
+
+
+class CatalogStore:
+    """Serves the latest successfully loaded Catalog for one file."""
+
+    def __init__(self, path=CATALOG_PATH, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = self._stat()
+        self._catalog = self._load()
+        self._checked = time.monotonic()
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            return Catalog.from_bytes(f.read())
+
+    def current(self):
+        if time.monotonic() - self._checked >= self.check_interval:
+            self._maybe_reload()
+        return self._catalog
+
+    def _maybe_reload(self):
+        with self._lock:
+            if time.monotonic() - self._checked < self.check_interval:
+                return
+            self._checked = time.monotonic()
+            try:
+                stamp = self._stat()
+                if stamp == self._stamp:
+                    return
+                catalog = self._load()
+            except (OSError, ValueError) as e:
+                # Keep serving the last good snapshot while the file is being
+                # edited or is broken.
+                log.warning("catalog reload from %s failed: %s", self.path, e)
+                return
+            self._stamp = stamp
+            self._catalog = catalog
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def current():
+    """The process-wide catalog snapshot, hot-reloaded when the file changes."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CatalogStore()
+    return _store.current()
@@ -0,0 +1,256 @@
+"""Headless entry point to the app's logic: profiles, plans, tracking and medical advice.
+
+``HealthAdvisor`` wraps one connection pool and the shared catalog. The
+Streamlit UI and the HTTP API (health_advisor.api) are both thin clients of
+it, and it has no UI dependencies of its own.
+
+Tracking writes go through a write-behind queue (health_advisor.writer) by
+default; reads overlay the events still queued, so callers always see their
+own writes.
+
+Invalid input raises ``ValueError``; unknown users, exercises or conditions
+raise ``NotFound``.
+"""
+from . import catalog, profiles, programs, rollups, search, tracking
+from .dates import month_start, today, week_start
+from .db import DB_PATH, ConnectionPool
+from .migrations import migrate
+from .nutrition import ACTIVITY_LEVELS, DIETS, GENDERS, age_group, diet_plan_alternatives
+from .writer import WriteBehind
+
+# Range label -> (rollup bucket, days covered)
+HISTORY_VIEWS = {"7 days": ("day", 7), "30 days": ("day", 30), "90 days": ("week", 90), "1 year": ("month", 365)}
+
+CONDITION_KINDS = ("medical_exercises", "medical_diet")
+
+
+class NotFound(LookupError):
+    pass
+
+
+def validate_profile(name, age, gender, activity, diet):
+    if not name or not str(name).strip():
+        raise ValueError("name is required")
+    if not isinstance(age, int) or not 10 <= age <= 100:
+        raise ValueError("age must be an integer between 10 and 100")
+    for value, allowed, field in ((gender, GENDERS, "gender"), (activity, ACTIVITY_LEVELS, "activity"),
+                                  (diet, DIETS, "diet")):
+        if value not in allowed:
+            raise ValueError(f"{field} must be one of {', '.join(allowed)}")
+
+
+class HealthAdvisor:
+    def __init__(self, pool, write_behind=False):
+        self.pool = pool
+        self.writer = WriteBehind(pool) if write_behind else None
+
+    @classmethod
+    def open(cls, path=DB_PATH, pool_size=8, write_behind=True):
+        """Open (and migrate) the database at ``path``."""
+        pool = ConnectionPool(path, size=pool_size)
+        migrate(pool)
+        return cls(pool, write_behind)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.pool.close()
+
+    def flush(self, timeout=None):
+        """Wait until queued tracking writes are committed."""
+        return self.writer.flush(timeout) if self.writer is not None else True
+
+    @property
+    def catalog(self):
+        return catalog.current()
+
+    # -- profiles -----------------------------------------------------------
+
+    def _conditions(self, names):
+        """Catalog spellings of the condition ``names`` (any case); unknown names raise ValueError."""
+        if not isinstance(names, (list, tuple)) or not all(isinstance(n, str) for n in names):
+            raise ValueError("medical_conditions must be a list of condition names")
+        known = {c.casefold(): c for c in self.catalog.conditions}
+        found, unknown = [], []
+        for name in names:
+            condition = known.get(" ".join(name.split()).casefold())
+            if condition is None:
+                unknown.append(name)
+            elif condition not in found:
+                found.append(condition)
+        if unknown:
+            raise ValueError(f"unknown medical conditions: {', '.join(unknown)}")
+        return found
+
+    def _with_conditions(self, profile):
+        return {**profile, "medical_conditions": list(
+            programs.parse_conditions(profile["medical_conditions"], self.catalog.conditions))}
+
+    def save_profile(self, name, age, gender, activity, diet, medical_conditions=None):
+        """Create or update ``name``'s profile and rebuild their program; returns the user id.
+
+        ``medical_conditions`` is a list of catalog condition names; None
+        keeps the ones already saved.
+        """
+        validate_profile(name, age, gender, activity, diet)
+        conditions = None if medical_conditions is None else ", ".join(self._conditions(medical_conditions))
+        user_id = profiles.save(self.pool, name, age, gender, activity, diet, conditions)
+        # Don't leave a new or changed profile without a matching program
+        # until the next batch run.
+        programs.refresh(self.pool, user_id)
+        return user_id
+
+    def load_profile(self, name):
+        """(user_id, profile dict or None) for ``name``; (None, None) for a new name.
+
+        One indexed read, and it never creates the user; callers can cache the
+        result until the profile is saved again.
+        """
+        user_id, profile = profiles.load(self.pool, name)
+        if user_id is None:
+            return None, None
+        # A user who has only tracked exercises has no profile yet.
+        return user_id, self._with_conditions(profile) if profile["age"] is not None else None
+
+    def profile(self, name):
+        """The saved profile for ``name`` as a dict."""
+        _, profile = profiles.load(self.pool, name)
+        if profile is None or profile["age"] is None:
+            raise NotFound(f"no profile for {name!r}")
+        return self._with_conditions(profile)
+
+    def user_id(self, name, create=False):
+        """The users.id for ``name``; unknown names raise NotFound unless ``create``."""
+        if create:
+            return profiles.user_id_for(self.pool, name)
+        user_id = profiles.find(self.pool, name)
+        if user_id is None:
+            raise NotFound(f"no user {name!r}")
+        return user_id
+
+    # -- plans --------------------------------------------------------------
+
+    def diet_plans(self, diet, age, gender, activity):
+        """(plans, calorie goal, protein goal); see nutrition.diet_plan_alternatives."""
+        validate_profile("-", age, gender, activity, diet)
+        return diet_plan_alternatives(diet, age, gender, activity)
+
+    def workout_plan(self, age):
+        """[(exercise, catalog entry, sets x reps for this age)] for every exercise."""
+        group = age_group(age)
+        return [(ex, info, info["sets_reps"][group]) for ex, info in self.catalog.exercises.items()]
+
+    def program(self, user_id):
+        """The user's precomputed multi-week program (see health_advisor.programs), or None."""
+        return programs.load(self.pool, user_id)
+
+    def program_day(self, user_id, day=None):
+        """(program, week, session or None on a rest day, meal option) for ``day`` (default today).
+
+        None if the user has no program or it does not cover ``day``.
+        """
+        program = self.program(user_id)
+        if program is None:
+            return None
+        found = programs.day_of(program, today() if day is None else day)
+        return None if found is None else (program, *found)
+
+    # -- tracking -----------------------------------------------------------
+
+    def check_write(self, exercise, token=None):
+        """Catalog entry for ``exercise`` after checking the arguments of record_exercise.
+
+        ValueError for an exercise that is not a string or a token that is
+        not a string or int; NotFound for an unknown exercise.
+        """
+        if not isinstance(exercise, str):
+            raise ValueError("exercise must be a string")
+        if token is not None and (not isinstance(token, (str, int)) or isinstance(token, bool)):
+            raise ValueError("token must be a string or integer")
+        info = self.catalog.exercises.get(exercise)
+        if info is None:
+            raise NotFound(f"unknown exercise {exercise!r}")
+        return info
+
+    def record_exercise(self, user_id, exercise, day=None, token=None):
+        """Mark ``exercise`` done; returns the calories credited, or None for a duplicate.
+
+        ``token`` makes the write idempotent: repeating a call with the same
+        user, exercise, day and token records it once. Raises
+        writer.QueueFull (an sqlite3.OperationalError) while the write queue
+        is backed up.
+        """
+        info = self.check_write(exercise, token)
+        day = today() if day is None else day
+        key = None if token is None else f"{user_id}:{exercise}:{day}:{token}"
+        if self.writer is not None:
+            # A key that is already stored would be skipped by the writer;
+            # report it as a duplicate now instead.
+            recorded = (key is None or not tracking.stored_keys(self.pool, [key])) and \
+                self.writer.submit(user_id, exercise, info["calories"], day, key)
+        else:
+            recorded = tracking.record_exercise(self.pool, user_id, exercise, info["calories"], day, key)
+        return info["calories"] if recorded else None
+
+    def _read_with_queued(self, user_id, first_day, last_day, read):
+        """``read()`` plus the queued events in [first_day, last_day] it doesn't include yet."""
+        events = self.writer.pending(user_id, first_day, last_day) if self.writer is not None else []
+        if not events:
+            return read(), []
+        # One database snapshot, pinned together with the queue so an event
+        # is either in the snapshot or in the overlay, never both. A replayed
+        # key that the insert will skip is dropped from the overlay as well.
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                events = self.writer.pending(user_id, first_day, last_day, conn)
+                rows = read()
+                stored = tracking.stored_keys(self.pool, [e.key for e in events if e.key is not None])
+            finally:
+                conn.execute("COMMIT")
+        return rows, [e for e in events if e.key is None or e.key not in stored]
+
+    def exercises_on(self, user_id, day=None):
+        """[(exercise, calories)] completed on ``day`` (default today), including queued writes."""
+        day = today() if day is None else day
+        rows, queued = self._read_with_queued(user_id, day, day,
+                                              lambda: tracking.exercises_on(self.pool, user_id, day))
+        return rows + [(e.exercise, e.calories) for e in queued]
+
+    def history(self, user_id, view="7 days", day=None):
+        """[(bucket start day, calories, exercises)] for one of HISTORY_VIEWS, including queued writes."""
+        if view not in HISTORY_VIEWS:
+            raise ValueError(f"view must be one of {', '.join(HISTORY_VIEWS)}")
+        period, days = HISTORY_VIEWS[view]
+        day = today() if day is None else day
+        since = day - (days - 1)
+        rows, queued = self._read_with_queued(user_id, since, day,
+                                              lambda: rollups.history(self.pool, user_id, period, since))
+        if not queued:
+            return rows
+        starts = {"day": lambda d: d, "week": week_start, "month": month_start}[period]
+        buckets = {start: (cal, n) for start, cal, n in rows}
+        for e in queued:
+            cal, n = buckets.get(starts(e.day), (0, 0))
+            buckets[starts(e.day)] = (cal + e.calories, n + 1)
+        return [(start, cal, n) for start, (cal, n) in sorted(buckets.items())]
+
+    # -- medical advice -----------------------------------------------------
+
+    def search_conditions(self, kind, query, limit=20, offset=0):
+        if kind not in CONDITION_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(CONDITION_KINDS)}")
+        return search.condition_index(self.catalog, kind).search(query, limit, offset)
+
+    def medical_exercises(self, condition):
+        advice = self.catalog.medical_exercises.get(condition)
+        if advice is None:
+            raise NotFound(f"no exercise advice for {condition!r}")
+        return advice
+
+    def medical_diet(self, condition):
+        """Mapping with "eat" and "avoid" lists."""
+        advice = self.catalog.medical_diet.get(condition)
+        if advice is None:
+            raise NotFound(f"no diet advice for {condition!r}")
+        return advice
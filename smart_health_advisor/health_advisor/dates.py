@@ -0,0 +1,27 @@
+"""Calendar helpers. Days are stored as integers counted from 1970-01-01."""
+import datetime
+import functools
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def day_number(date):
+    return (date - EPOCH).days
+
+
+def from_day_number(day):
+    return EPOCH + datetime.timedelta(days=day)
+
+
+def today():
+    return day_number(datetime.date.today())
+
+
+def week_start(day):
+    # Day 0 was a Thursday, so (day + 3) % 7 is the number of days since Monday.
+    return day - (day + 3) % 7
+
+
+@functools.lru_cache(maxsize=4096)
+def month_start(day):
+    return day_number(from_day_number(day).replace(day=1))
@@ -0,0 +1,141 @@
+"""SQLite data-access layer: a bounded connection pool with WAL journaling."""
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from . import metrics
+
+# HEALTH_ADVISOR_DB points the app (and the CLIs' defaults) at another file.
+DB_PATH = os.environ.get('HEALTH_ADVISOR_DB', 'health_advisor.db')
+
+# Seconds a statement waits on a locked database before giving up.
+BUSY_TIMEOUT = 5.0
+
+# Applied to every pooled connection. WAL lets readers keep running while a
+# writer commits; synchronous=NORMAL is durable across app crashes in WAL mode
+# and avoids an fsync per commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free in time."""
+
+
+def connect(path=DB_PATH):
+    # isolation_level=None keeps the connection in autocommit mode so that
+    # transactions are always opened explicitly (see ConnectionPool.transaction).
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           isolation_level=None, factory=metrics.connection_factory())
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Hands out at most ``size`` connections, one per thread at a time.
+
+    A thread that asks for a connection while it already holds one gets the
+    same connection back, so helpers can nest ``connection()`` and
+    ``transaction()`` freely.
+    """
+
+    def __init__(self, path=DB_PATH, size=8, acquire_timeout=10.0):
+        self.path = path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return connect(self.path)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"no database connection free after {self.acquire_timeout}s") from None
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run the block in a write transaction, committing on success."""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            _begin_immediate(conn)
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def execute(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+
+def _begin_immediate(conn, attempts=3):
+    # BEGIN IMMEDIATE takes the write lock up front so a transaction can never
+    # fail half-way through on a lock upgrade. The busy timeout already waits
+    # for other writers; retry a couple of times with backoff before giving up.
+    for attempt in range(attempts):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
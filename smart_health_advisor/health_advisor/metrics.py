@@ -0,0 +1,332 @@
+"""Opt-in instrumentation: section timers, SQL profiling and Prometheus export.
+
+Off unless ``HEALTH_ADVISOR_METRICS=1`` is set. When off, ``section()``
+returns a shared no-op context manager, ``timed()`` returns the function
+unchanged and pooled connections are plain ``sqlite3.Connection`` objects,
+so the cost is one attribute lookup per call site.
+
+When on, every statement run through a pooled connection is timed from
+``execute`` until its cursor is exhausted or dropped, bucketed by statement
+("SELECT daily_rollup", "INSERT daily_track", ...), and statements slower
+than ``HEALTH_ADVISOR_SLOW_QUERY_MS`` (default 50) are kept with their
+``EXPLAIN QUERY PLAN`` output. Everything lives in one process-wide
+``Registry``; ``prometheus_text()`` renders it in the Prometheus text format
+and ``serve(port)`` exposes that at ``/metrics`` from a background thread.
+"""
+import bisect
+import collections
+import contextlib
+import functools
+import hmac
+import http.server
+import os
+import re
+import sqlite3
+import threading
+import time
+
+ENABLED = os.environ.get("HEALTH_ADVISOR_METRICS", "") not in ("", "0")
+SLOW_QUERY_MS = float(os.environ.get("HEALTH_ADVISOR_SLOW_QUERY_MS", "50"))
+# Shown in the app's admin tab only when ?admin=<token> matches this.
+ADMIN_TOKEN = os.environ.get("HEALTH_ADVISOR_ADMIN_TOKEN")
+# If set, the Streamlit process serves /metrics on this port.
+PORT = int(os.environ.get("HEALTH_ADVISOR_METRICS_PORT") or 0)
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000)
+
+SLOW_LOG_SIZE = 100
+
+_VERB = re.compile(r"\s*(\w+)")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|INDEX|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([\w.]+)", re.IGNORECASE)
+
+
+class Histogram:
+    """Counts per upper bound (Prometheus ``le``) plus a running sum."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (inf past the last bucket)."""
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if n and seen >= target:
+                return bound
+        return None
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (help, buckets, {labels tuple: Histogram})
+        self._families = {}
+        self.slow_queries = collections.deque(maxlen=SLOW_LOG_SIZE)
+        self._plans = {}
+
+    def define(self, name, help, buckets=SECONDS_BUCKETS):
+        self._families.setdefault(name, (help, buckets, {}))
+
+    def observe(self, name, value, **labels):
+        _, buckets, series = self._families[name]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def record_slow(self, conn, sql, params, seconds, rows):
+        plan = self._plans.get(sql)
+        if plan is None:
+            try:
+                # Bypass the instrumented execute so the EXPLAIN is not itself profiled.
+                plan = "\n".join(row[-1] for row in sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql,
+                                                                               params))
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                plan = f"(no plan: {e})"
+            if len(self._plans) >= 1000:
+                self._plans.clear()
+            self._plans[sql] = plan
+        self.slow_queries.appendleft({"at": time.time(), "ms": round(seconds * 1000, 3), "rows": rows,
+                                      "sql": " ".join(sql.split()), "plan": plan})
+
+    def snapshot(self):
+        """[(name, labels dict, Histogram copy)] for every series."""
+        out = []
+        with self._lock:
+            for name, (_, buckets, series) in sorted(self._families.items()):
+                for key, hist in sorted(series.items()):
+                    copy = Histogram(buckets)
+                    copy.counts, copy.total = list(hist.counts), hist.total
+                    out.append((name, dict(key), copy))
+        return out
+
+    def reset(self):
+        with self._lock:
+            for _, _, series in self._families.values():
+                series.clear()
+            self.slow_queries.clear()
+            self._plans.clear()
+
+    def prometheus_text(self):
+        lines = []
+        snapshot = self.snapshot()
+        for name, (help, _, _) in sorted(self._families.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} histogram")
+            for series_name, labels, hist in snapshot:
+                if series_name != name:
+                    continue
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                cumulative = 0
+                for bound, n in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{base}{"," if base else ""}le="{le}"}} {cumulative}')
+                suffix = f"{{{base}}}" if base else ""
+                lines.append(f"{name}_sum{suffix} {hist.total}")
+                lines.append(f"{name}_count{suffix} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+registry.define("health_advisor_section_seconds", "Time spent rendering one section of the app per run.")
+registry.define("health_advisor_sql_seconds", "SQLite statement latency, from execute until the cursor is done.")
+registry.define("health_advisor_sql_rows", "Rows returned (or changed) per SQLite statement.", ROWS_BUCKETS)
+registry.define("health_advisor_http_seconds", "HTTP API request latency.")
+
+
+def statement_name(sql):
+    """Short label for a statement: its verb and first table, e.g. "SELECT daily_rollup"."""
+    verb = _VERB.match(sql)
+    table = _TABLE.search(sql)
+    return " ".join(filter(None, ((verb.group(1).upper() if verb else "?"), table and table.group(1))))
+
+
+# -- sections -------------------------------------------------------------
+
+class _Section:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        registry.observe("health_advisor_section_seconds", time.perf_counter() - self.start, section=self.name)
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def section(name):
+    """Context manager timing one section of a run."""
+    return _Section(name) if ENABLED else _NOOP
+
+
+def timed(name):
+    """Decorator form of section(); returns the function untouched when metrics are off."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# -- SQL ------------------------------------------------------------------
+
+class _TimedCursor:
+    """Cursor proxy that records its statement once all rows are read (or it is dropped)."""
+
+    def __init__(self, conn, cursor, sql, params, elapsed):
+        self._conn = conn
+        self._cursor = cursor
+        self._sql = sql
+        self._params = params
+        self._elapsed = elapsed
+        self._rows = 0
+        self._done = False
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            _record(self._conn, self._sql, self._params, self._elapsed, self._rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._elapsed += time.perf_counter() - start
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(self._cursor.arraysize if size is None else size)
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._elapsed += time.perf_counter() - start
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+def _record(conn, sql, params, seconds, rows):
+    name = statement_name(sql)
+    registry.observe("health_advisor_sql_seconds", seconds, statement=name)
+    registry.observe("health_advisor_sql_rows", rows, statement=name)
+    if seconds * 1000 >= SLOW_QUERY_MS and not sql.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+        registry.record_slow(conn, sql, params, seconds, rows)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory that profiles execute() and executemany()."""
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        cursor = super().execute(sql, params)
+        elapsed = time.perf_counter() - start
+        if cursor.description is None:
+            _record(self, sql, params, elapsed, max(cursor.rowcount, 0))
+            return cursor
+        return _TimedCursor(self, cursor, sql, params, elapsed)
+
+    def executemany(self, sql, seq_of_params):
+        # Keep the first parameter row for the slow-query plan; a generator
+        # could only be read once.
+        if not isinstance(seq_of_params, (list, tuple)):
+            seq_of_params = list(seq_of_params)
+        if not seq_of_params:
+            return super().executemany(sql, seq_of_params)
+        start = time.perf_counter()
+        cursor = super().executemany(sql, seq_of_params)
+        _record(self, sql, seq_of_params[0], time.perf_counter() - start, max(cursor.rowcount, 0))
+        return cursor
+
+
+def connection_factory():
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+# -- export ---------------------------------------------------------------
+
+def prometheus_text():
+    return registry.prometheus_text()
+
+
+def admin_allowed(token):
+    return bool(ENABLED and ADMIN_TOKEN and token and hmac.compare_digest(str(token), ADMIN_TOKEN))
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics on ``host:port`` from a daemon thread; returns the server."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,249 @@
+"""Versioned schema migrations, tracked in SQLite's ``PRAGMA user_version``.
+
+Each migration runs in its own write transaction together with the version
+bump, so a database is always at exactly one schema version. WAL readers keep
+seeing the previous version until the migration commits.
+
+Run ``python -m health_advisor.migrations path/to/db`` to upgrade a file in place.
+"""
+import sys
+
+from .db import ConnectionPool
+from .profiles import normalize_name
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _baseline(conn):
+    # Tables as the app originally created them. Older files (for example
+    # data/sample_users.db) have a users table with a different column set,
+    # so fill in whatever the app relies on.
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        age INTEGER,
+        gender TEXT,
+        activity TEXT,
+        diet TEXT
+    )''')
+    cols = _columns(conn, 'users')
+    for col, decl in (("name", "TEXT"), ("age", "INTEGER"), ("gender", "TEXT"),
+                      ("activity", "TEXT"), ("diet", "TEXT")):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE users ADD COLUMN {col} {decl}")
+    if "activity_level" in cols:
+        conn.execute("UPDATE users SET activity = activity_level WHERE activity IS NULL")
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_track (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        exercise TEXT,
+        calories INT,
+        completed BOOLEAN,
+        date TEXT
+    )''')
+
+
+def _normalize_daily_track(conn):
+    # Key tracking rows by users.id and store the date as a day number
+    # (days since 1970-01-01) so that both tracker queries are a single range
+    # scan over the covering index.
+    conn.execute("CREATE INDEX IF NOT EXISTS users_name ON users(name)")
+    conn.execute('''INSERT INTO users (name)
+        SELECT DISTINCT name FROM daily_track
+        WHERE name IS NOT NULL AND name NOT IN (SELECT name FROM users WHERE name IS NOT NULL)''')
+    conn.execute('''CREATE TABLE daily_track_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        exercise TEXT NOT NULL,
+        calories INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 1,
+        day INTEGER NOT NULL
+    )''')
+    conn.execute('''INSERT INTO daily_track_new (id, user_id, exercise, calories, completed, day)
+        SELECT t.id, u.id, t.exercise, COALESCE(t.calories, 0), COALESCE(t.completed, 1),
+               CAST(julianday(t.date) - 2440587.5 AS INTEGER)
+        FROM daily_track t
+        JOIN (SELECT name, MIN(id) AS id FROM users GROUP BY name) u ON u.name = t.name
+        WHERE t.exercise IS NOT NULL AND julianday(t.date) IS NOT NULL''')
+    # Rows that can't be keyed (no name, no exercise or an unparseable date)
+    # are kept as they were for manual repair rather than dropped.
+    conn.execute('''CREATE TABLE daily_track_quarantine AS
+        SELECT * FROM daily_track WHERE id NOT IN (SELECT id FROM daily_track_new)''')
+    conn.execute("DROP TABLE daily_track")
+    conn.execute("ALTER TABLE daily_track_new RENAME TO daily_track")
+    conn.execute('''CREATE INDEX daily_track_user_day
+        ON daily_track(user_id, day, completed, exercise, calories)''')
+
+
+# Rollup tables and rebuild as of schema version 3. Migrations use this
+# frozen copy rather than health_advisor.rollups so that later changes there
+# can't alter what a shipped step does.
+_ROLLUP_TABLES_V3 = (
+    '''CREATE TABLE IF NOT EXISTS daily_rollup (
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        calories INTEGER NOT NULL,
+        exercises INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS period_rollup (
+        user_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        start_day INTEGER NOT NULL,
+        calories INTEGER NOT NULL,
+        exercises INTEGER NOT NULL,
+        PRIMARY KEY (user_id, period, start_day)
+    ) WITHOUT ROWID''',
+)
+_PERIOD_STARTS_V3 = (
+    ("week", "day - (day + 3) % 7"),
+    ("month", "CAST(julianday(date(day * 86400, 'unixepoch', 'start of month')) - 2440587.5 AS INTEGER)"),
+)
+
+
+def _rebuild_rollups_v3(conn, user_ids=None):
+    for sql in _ROLLUP_TABLES_V3:
+        conn.execute(sql)
+    only = ""
+    if user_ids is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS migrate_users (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM migrate_users")
+        conn.executemany("INSERT OR IGNORE INTO migrate_users (id) VALUES (?)", ((u,) for u in user_ids))
+        only = " AND user_id IN (SELECT id FROM migrate_users)"
+    conn.execute("DELETE FROM daily_rollup WHERE 1" + only)
+    conn.execute("DELETE FROM period_rollup WHERE 1" + only)
+    conn.execute(f'''INSERT INTO daily_rollup (user_id, day, calories, exercises)
+        SELECT user_id, day, SUM(calories), COUNT(*) FROM daily_track
+        WHERE completed=1{only} GROUP BY user_id, day''')
+    for period, start_sql in _PERIOD_STARTS_V3:
+        conn.execute(f'''INSERT INTO period_rollup (user_id, period, start_day, calories, exercises)
+            SELECT user_id, ?, {start_sql} AS start_day, SUM(calories), SUM(exercises)
+            FROM daily_rollup WHERE 1{only} GROUP BY user_id, start_day''', (period,))
+
+
+def _add_rollups(conn):
+    # Backfill from the raw table; later inserts keep them current incrementally.
+    _rebuild_rollups_v3(conn)
+
+
+def _add_import_checkpoints(conn):
+    # Bulk imports record how far they got in the same transaction as each
+    # batch, so a resumed import never loads a batch twice.
+    conn.execute('''CREATE TABLE import_checkpoints (
+        source TEXT PRIMARY KEY,
+        byte_offset INTEGER NOT NULL,
+        rows_imported INTEGER NOT NULL,
+        rows_rejected INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )''')
+
+
+def _add_event_keys(conn):
+    # Clicks carry an idempotency key; a unique index over the keyed rows lets
+    # a replayed or double-submitted event be dropped at insert time. Rows
+    # without a key (bulk imports, older data) are not constrained.
+    conn.execute("ALTER TABLE daily_track ADD COLUMN event_key TEXT")
+    conn.execute("CREATE UNIQUE INDEX daily_track_event_key ON daily_track(event_key) WHERE event_key IS NOT NULL")
+
+
+def _unique_users(conn):
+    # Saving a profile used to insert a new users row every time, so one
+    # person can have many rows. Give every user a normalized name_key, fold
+    # each group of rows sharing a key into its oldest row (which keeps the
+    # newest profile values), repoint tracking rows at it and recompute the
+    # affected rollups. The unique index then makes name_key the identity.
+    if "name_key" not in _columns(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN name_key TEXT")
+    conn.executemany("UPDATE users SET name_key=? WHERE id=?",
+                     [(normalize_name(name), user_id) for user_id, name in
+                      conn.execute("SELECT id, name FROM users WHERE name IS NOT NULL").fetchall()])
+    groups = {}
+    for user_id, key in conn.execute("SELECT id, name_key FROM users WHERE name_key IN "
+                                     "(SELECT name_key FROM users GROUP BY name_key HAVING COUNT(*) > 1) "
+                                     "ORDER BY name_key, id"):
+        groups.setdefault(key, []).append(user_id)
+    merged = []
+    for key, ids in groups.items():
+        keep, others = ids[0], ids[1:]
+        latest = conn.execute(f"""SELECT name, age, gender, activity, diet FROM users
+            WHERE id IN ({','.join('?' * len(ids))}) AND age IS NOT NULL ORDER BY id DESC LIMIT 1""", ids).fetchone()
+        marks = ",".join("?" * len(others))
+        conn.execute(f"UPDATE daily_track SET user_id=? WHERE user_id IN ({marks})", [keep] + others)
+        conn.execute(f"DELETE FROM users WHERE id IN ({marks})", others)
+        if latest:
+            conn.execute("UPDATE users SET name=?, age=?, gender=?, activity=?, diet=? WHERE id=?", (*latest, keep))
+        merged += ids
+    if merged:
+        _rebuild_rollups_v3(conn, merged)
+    conn.execute("DROP INDEX IF EXISTS users_name")
+    conn.execute("CREATE UNIQUE INDEX users_name_key ON users(name_key)")
+
+
+def _add_user_plans(conn):
+    # Programs precomputed by the nightly batch job (health_advisor.programs),
+    # one JSON document per user. Profiles may list medical conditions that
+    # shape the program; older files such as data/sample_users.db already
+    # have the column.
+    if "medical_conditions" not in _columns(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN medical_conditions TEXT")
+    conn.execute('''CREATE TABLE user_plans (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        start_day INTEGER NOT NULL,
+        weeks INTEGER NOT NULL,
+        catalog_version TEXT NOT NULL,
+        generated_at TEXT NOT NULL,
+        plan TEXT NOT NULL
+    )''')
+
+
+def _add_checkpoint_identity(conn):
+    # A checkpoint is only a byte offset; resuming it against a different file
+    # at the same path would skip that file's first rows. Record a hash of the
+    # file's head so the importer can tell. Checkpoints from before this step
+    # have no hash and are resumed as they were.
+    conn.execute("ALTER TABLE import_checkpoints ADD COLUMN head_bytes INTEGER")
+    conn.execute("ALTER TABLE import_checkpoints ADD COLUMN head_sha256 TEXT")
+
+
+# (version, description, function). Append only; never edit a shipped step.
+MIGRATIONS = [
+    (1, "baseline users and daily_track tables", _baseline),
+    (2, "key daily_track by users.id with a covering (user, day) index", _normalize_daily_track),
+    (3, "daily, weekly and monthly rollup tables", _add_rollups),
+    (4, "bulk import checkpoints", _add_import_checkpoints),
+    (5, "idempotency keys on daily_track", _add_event_keys),
+    (6, "one users row per normalized name", _unique_users),
+    (7, "precomputed per-user programs", _add_user_plans),
+    (8, "identify the file behind each import checkpoint", _add_checkpoint_identity),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(pool):
+    """Apply every pending migration; returns the list of versions applied."""
+    applied = []
+    for version, _, step in MIGRATIONS:
+        with pool.transaction() as conn:
+            # Re-read inside the write lock so concurrent processes starting up
+            # at the same time don't apply a step twice.
+            if schema_version(conn) >= version:
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:] or ['health_advisor.db']:
+        pool = ConnectionPool(path, size=1)
+        applied = migrate(pool)
+        pool.close()
+        print(f"{path}: applied {applied or 'nothing'}, now at version {SCHEMA_VERSION}")
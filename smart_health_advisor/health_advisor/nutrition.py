@@ -0,0 +1,89 @@
+"""Nutrition goals and diet plans, precomputed for every possible profile.
+
+The inputs are tiny (diet x age group x gender x activity = 64 profiles), so
+both goals and plans are computed once per process and looked up afterwards.
+The plan table is rebuilt automatically whenever the food catalog's content
+fingerprint changes.
+"""
+import itertools
+import threading
+
+from . import catalog
+from .planner import MealIndex, plan_day
+
+AGE_GROUPS = ("10-17", "18-29", "30-49", "50+")
+GENDERS = ("Male", "Female")
+ACTIVITY_LEVELS = ("Sedentary", "Light", "Moderate", "Very Active")
+DIETS = ("Vegetarian", "Non-Vegetarian")
+
+_CAL_BASE = {"10-17": 2000, "18-29": 2400, "30-49": 2200, "50+": 2000}
+_PROT_BASE = {"10-17": 50, "18-29": 70, "30-49": 60, "50+": 50}
+_MULTIPLIER = {"Sedentary": 0.9, "Light": 1.0, "Moderate": 1.2, "Very Active": 1.4}
+
+
+def age_group(age):
+    if age<18: return "10-17"
+    elif age<30: return "18-29"
+    elif age<50: return "30-49"
+    else: return "50+"
+
+
+def _goals(group, gender, activity):
+    cal, prot = _CAL_BASE[group], _PROT_BASE[group]
+    if gender == "Male":
+        cal, prot = int(cal * 1.1), int(prot * 1.1)
+    return int(cal * _MULTIPLIER[activity]), int(prot * _MULTIPLIER[activity])
+
+
+# (age group, gender, activity) -> (calorie goal, protein goal)
+NUTRITION_GOALS = {key: _goals(*key) for key in itertools.product(AGE_GROUPS, GENDERS, ACTIVITY_LEVELS)}
+
+
+def get_nutrition_goals(age, gender, activity):
+    return NUTRITION_GOALS[(age_group(age), gender, activity)]
+
+
+class PlanBook:
+    """Ranked diet plans for every profile, for one version of the food catalog."""
+
+    def __init__(self, foods, version, alternatives=3):
+        self.version = version
+        self.index = MealIndex(foods)
+        self.plans = {}
+        for diet, (group, gender, activity) in itertools.product(DIETS, NUTRITION_GOALS):
+            cal_goal, prot_goal = NUTRITION_GOALS[(group, gender, activity)]
+            self.plans[(diet, group, gender, activity)] = (
+                tuple(plan_day(self.index, diet, cal_goal, prot_goal, alternatives)), cal_goal, prot_goal)
+
+    def lookup(self, diet_pref, age, gender, activity):
+        return self.plans[(diet_pref, age_group(age), gender, activity)]
+
+
+def _build_book():
+    snapshot = catalog.current()
+    return PlanBook(snapshot.foods, snapshot.version)
+
+
+_book = _build_book()
+_book_lock = threading.Lock()
+
+
+def plan_book():
+    """The process-wide PlanBook, rebuilt if the food catalog has changed."""
+    global _book
+    if _book.version != catalog.current().version:
+        with _book_lock:
+            if _book.version != catalog.current().version:
+                _book = _build_book()
+    return _book
+
+
+def diet_plan_alternatives(diet_pref, age, gender, activity):
+    """(plans, calorie goal, protein goal) with plans as planner.Plan tuples, best first."""
+    return plan_book().lookup(diet_pref, age, gender, activity)
+
+
+def generate_diet_plan(diet_pref, age, gender, activity):
+    """(plan, calorie goal, protein goal); the plan is a tuple of read-only food entries."""
+    plans, cal_goal, prot_goal = diet_plan_alternatives(diet_pref, age, gender, activity)
+    return (plans[0].meals if plans else ()), cal_goal, prot_goal
@@ -0,0 +1,112 @@
+"""Diet plan optimizer over a meal-type index of the food catalog.
+
+Foods are grouped by (meal, diet type) into compact arrays sorted by
+calories. For planning, each group is reduced to one option per 10 kcal
+bucket (the highest-protein food in that bucket), so the cost of a plan
+depends on the number of calorie buckets rather than the catalog size.
+
+A day plan is a multiple-choice knapsack: pick one food per meal slot,
+staying within the calorie goal, getting as close to it as possible and
+reaching the protein goal. A dynamic program over calorie buckets keeps the
+best protein total for every reachable calorie total, and the best few end
+states are returned as ranked alternatives.
+"""
+import array
+import bisect
+import collections
+import heapq
+import types
+
+MEALS_ORDER = ("Breakfast", "Snack", "Lunch", "Snack", "Dinner")
+
+BUCKET_KCAL = 10
+
+# meals: tuple of read-only food entries (each with a "name" key);
+# score: calorie shortfall + protein shortfall, as fractions of the goals.
+Plan = collections.namedtuple("Plan", "meals calories protein score")
+
+
+class MealIndex:
+    """Read-only index of a food catalog by (meal, type)."""
+
+    def __init__(self, foods):
+        groups = collections.defaultdict(list)
+        for name, info in foods.items():
+            groups[(info["meal"], info["type"])].append((info["calories"], -info["protein"], name))
+        self.entries = {}
+        self.calories = {}
+        self.protein = {}
+        self.options = {}
+        for key, rows in groups.items():
+            rows.sort()
+            self.entries[key] = tuple(types.MappingProxyType(dict(foods[name], name=name)) for _, _, name in rows)
+            self.calories[key] = array.array('i', (cal for cal, _, _ in rows))
+            self.protein[key] = array.array('i', (-neg for _, neg, _ in rows))
+            self.options[key] = self._bucket_options(self.calories[key], self.protein[key])
+
+    @staticmethod
+    def _bucket_options(calories, protein):
+        # (bucket, protein, position) for the best-protein food in each
+        # calorie bucket, ascending by bucket. Buckets round up so a plan's
+        # bucket total never understates its calories.
+        best = {}
+        for pos, (cal, prot) in enumerate(zip(calories, protein)):
+            bucket = -(-cal // BUCKET_KCAL)
+            if bucket not in best or prot > best[bucket][1]:
+                best[bucket] = (bucket, prot, pos)
+        return tuple(best[b] for b in sorted(best))
+
+    def foods_for(self, meal, diet, max_calories=None):
+        """Entries for one slot, ascending by calories, optionally capped."""
+        entries = self.entries.get((meal, diet), ())
+        if max_calories is None:
+            return entries
+        return entries[:bisect.bisect_right(self.calories[(meal, diet)], max_calories)]
+
+
+def _score(cal, prot, cal_goal, prot_goal):
+    return (cal_goal - cal) / cal_goal + max(0, prot_goal - prot) / prot_goal
+
+
+def plan_day(index, diet, cal_goal, prot_goal, alternatives=3):
+    """Up to ``alternatives`` plans for one day, best first."""
+    cap = cal_goal // BUCKET_KCAL
+    states = {0: 0}  # calorie bucket total -> best protein total
+    steps = []       # per slot: (key, {total: (previous total, position)}) or None if skipped
+    for meal in MEALS_ORDER:
+        key = (meal, diet)
+        options = index.options.get(key, ())
+        reached, back = {}, {}
+        for total, prot in states.items():
+            for bucket, item_prot, pos in options:
+                new_total = total + bucket
+                if new_total > cap:
+                    break
+                new_prot = prot + item_prot
+                if new_prot > reached.get(new_total, -1):
+                    reached[new_total] = new_prot
+                    back[new_total] = (total, pos)
+        if not reached:
+            # Nothing fits in this slot any more; leave it out, as before.
+            steps.append(None)
+            continue
+        states = reached
+        steps.append((key, back))
+
+    best = heapq.nsmallest(alternatives, states.items(),
+                           key=lambda s: _score(s[0] * BUCKET_KCAL, s[1], cal_goal, prot_goal))
+    plans = []
+    for total, _ in best:
+        meals = []
+        for step in reversed(steps):
+            if step is None:
+                continue
+            key, back = step
+            total, pos = back[total]
+            meals.append(index.entries[key][pos])
+        meals.reverse()
+        cal = sum(m["calories"] for m in meals)
+        prot = sum(m["protein"] for m in meals)
+        plans.append(Plan(tuple(meals), cal, prot, _score(cal, prot, cal_goal, prot_goal)))
+    plans.sort(key=lambda p: p.score)
+    return plans
@@ -0,0 +1,58 @@
+"""User profiles, one row per person.
+
+A user is identified by ``users.name_key``: the name as typed with case and
+whitespace normalized ("  Ann  Lee" and "ann lee" are the same person). It is
+unique and indexed, so every lookup below is a single index probe however
+many users there are. Saving a profile updates that row in place (upsert);
+``name`` keeps the spelling used most recently. Only saving a profile or
+recording an exercise creates a user; looking one up never does.
+"""
+PROFILE_COLUMNS = ("name", "age", "gender", "activity", "diet", "medical_conditions")
+
+
+def normalize_name(name):
+    return " ".join(str(name).split()).casefold()
+
+
+def find(pool, name):
+    """The users.id for ``name``, or None if there is no such user."""
+    rows = pool.execute("SELECT id FROM users WHERE name_key=?", (normalize_name(name),))
+    return rows[0][0] if rows else None
+
+
+def user_id_for(pool, name):
+    """Return the users.id for ``name``, creating a bare row if needed."""
+    key = normalize_name(name)
+    rows = pool.execute("SELECT id FROM users WHERE name_key=?", (key,))
+    if rows:
+        return rows[0][0]
+    with pool.transaction() as conn:
+        conn.execute("INSERT INTO users (name, name_key) VALUES (?,?) ON CONFLICT (name_key) DO NOTHING",
+                     (" ".join(str(name).split()), key))
+        return conn.execute("SELECT id FROM users WHERE name_key=?", (key,)).fetchone()[0]
+
+
+def load(pool, name):
+    """(user_id, {column: value}) for ``name``, or (None, None) if there is no such user."""
+    rows = pool.execute(f"SELECT id, {', '.join(PROFILE_COLUMNS)} FROM users WHERE name_key=?",
+                        (normalize_name(name),))
+    if not rows:
+        return None, None
+    return rows[0][0], dict(zip(PROFILE_COLUMNS, rows[0][1:]))
+
+
+def save(pool, name, age, gender, activity, diet, medical_conditions=None):
+    """Create or update the profile for ``name``; returns its users.id.
+
+    ``medical_conditions`` is the comma separated text stored as is; None
+    leaves the stored value alone.
+    """
+    key = normalize_name(name)
+    with pool.transaction() as conn:
+        conn.execute('''INSERT INTO users (name, name_key, age, gender, activity, diet, medical_conditions)
+            VALUES (?,?,?,?,?,?,?)
+            ON CONFLICT (name_key) DO UPDATE SET name=excluded.name, age=excluded.age, gender=excluded.gender,
+                activity=excluded.activity, diet=excluded.diet,
+                medical_conditions=COALESCE(excluded.medical_conditions, users.medical_conditions)''',
+                     (" ".join(str(name).split()), key, age, gender, activity, diet, medical_conditions))
+        return conn.execute("SELECT id FROM users WHERE name_key=?", (key,)).fetchone()[0]
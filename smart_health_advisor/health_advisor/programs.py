@@ -0,0 +1,331 @@
+"""Periodized multi-week workout and meal programs, precomputed per user.
+
+A program covers ``weeks`` weeks starting on a Monday, and its weeks run
+through a fixed cycle of phases (see PHASES) from the first one. Rebuilding a
+program that still covers the current week keeps its first week, so the
+nightly run carries the cycle on instead of restarting it; once a program has
+run out, the next one starts on the Monday of the week it is built in. The
+details follow the user's history up to the build:
+
+* sessions per week start from the activity level, one fewer when the user
+  trained on less than half the planned days of the last HISTORY_DAYS and
+  one more when they trained on nearly all of them;
+* harder catalog levels unlock with recent completions, and are capped at
+  Intermediate when the profile lists a condition with exercise advice; that
+  advice is scheduled alongside every session;
+* sessions rotate through the unlocked exercises, least practiced first,
+  and each week carries on where the last one stopped;
+* sets and reps start from the catalog's prescription for the age group and
+  grow through the cycle and from one cycle to the next, with an extra rep
+  in the harder weeks for exercises the user already does regularly; the
+  deload week cuts both sets and reps back;
+* each day gets one of the ranked diet plans for the profile, rotating
+  through the options and skipping those with foods the conditions' diet
+  advice says to avoid.
+
+``build_program()`` is pure. ``run()`` is the batch job: it splits the users
+into id ranges and fans them out over a process pool. Each worker opens its
+own connection, reads a range of profiles with one query and each user's
+recent tracking with one covering-index seek, and returns the programs as
+JSON; the parent upserts them into ``user_plans`` one transaction per range,
+so SQLite only ever sees one writer however many workers run.
+
+    python -m health_advisor.programs [--weeks 4] [--workers 8]
+"""
+import argparse
+import collections
+import concurrent.futures
+import datetime
+import json
+import os
+import sys
+import time
+
+from . import catalog
+from .dates import day_number, today, week_start
+from .db import DB_PATH, ConnectionPool, connect
+from .migrations import migrate
+from .nutrition import ACTIVITY_LEVELS, DIETS, GENDERS, age_group, plan_book
+
+WEEKS = 4
+# Tracking history that drives adherence, unlocks and progression.
+HISTORY_DAYS = 28
+# Users per task handed to a worker, and per write transaction.
+CHUNK_USERS = 1000
+
+# One cycle of (name, sets added, reps added, share of sets and reps kept).
+PHASES = (("base", 0, 0, 1.0), ("build", 0, 2, 1.0), ("peak", 1, 2, 1.0), ("deload", 0, 0, 0.6))
+# Reps added for every full cycle a program has been through.
+CYCLE_REPS = 2
+
+SESSIONS = {"Sedentary": 2, "Light": 3, "Moderate": 4, "Very Active": 5}
+MIN_SESSIONS, MAX_SESSIONS = 2, 6
+EXERCISES_PER_SESSION = 3
+
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+# Completions in the last HISTORY_DAYS that unlock each level beyond the first.
+UNLOCK = {"Intermediate": 8, "Advanced": 24}
+# Completions of one exercise after which it gets PRACTICED_REPS more in the
+# phases that add reps.
+PRACTICED = 4
+PRACTICED_REPS = 1
+# Volume multiplier while any condition with exercise advice applies.
+CONDITION_VOLUME = 0.8
+THERAPY_PER_SESSION = 3
+
+Inputs = collections.namedtuple("Inputs", "user_id age gender activity diet conditions history")
+
+
+def parse_conditions(text, known):
+    """Catalog condition names listed in ``text`` (comma or semicolon separated, any case)."""
+    if not text:
+        return ()
+    by_key = {name.casefold(): name for name in known}
+    found = []
+    for part in str(text).replace(";", ",").split(","):
+        name = by_key.get(" ".join(part.split()).casefold())
+        if name and name not in found:
+            found.append(name)
+    return tuple(found)
+
+
+def _sets_reps(text):
+    sets, reps = text.split("x")
+    return int(sets), int(reps)
+
+
+def _sessions_per_week(activity, active_days):
+    planned = SESSIONS[activity]
+    adherence = active_days / (planned * HISTORY_DAYS / 7)
+    if adherence < 0.5:
+        planned -= 1
+    elif adherence >= 0.9:
+        planned += 1
+    return max(MIN_SESSIONS, min(MAX_SESSIONS, planned))
+
+
+def _level(completions, activity, conditions):
+    level = 0
+    if completions >= UNLOCK["Intermediate"] or activity in ("Moderate", "Very Active"):
+        level = 1
+    if completions >= UNLOCK["Advanced"] and activity == "Very Active":
+        level = 2
+    return min(level, 1) if conditions else level
+
+
+def build_program(inputs, snapshot, book, start_day, weeks=WEEKS):
+    """The program for one user as a JSON-ready dict.
+
+    The program's first week is the one ``start_day`` falls in.
+    ``inputs.history`` is [(day, exercise)] for completed exercises in the
+    HISTORY_DAYS before the build; ``snapshot`` is a catalog.Catalog and
+    ``book`` a nutrition.PlanBook built from it. Sessions list exercises as
+    [name, sets, reps]; ``meals`` holds an index into ``menus`` per weekday.
+    """
+    group = age_group(inputs.age)
+    done = collections.Counter(ex for _, ex in inputs.history)
+    active_days = len({day for day, _ in inputs.history})
+    exercise_conditions = [c for c in inputs.conditions if c in snapshot.medical_exercises]
+    level = _level(sum(done.values()), inputs.activity, exercise_conditions)
+    sessions = _sessions_per_week(inputs.activity, active_days)
+
+    # Least practiced first, so the rotation brings neglected exercises back.
+    allowed = sorted((ex for ex, info in snapshot.exercises.items() if LEVELS.index(info["level"]) <= level),
+                     key=lambda ex: (done[ex], ex))
+    per_session = min(EXERCISES_PER_SESSION, len(allowed))
+    therapy = []
+    for condition in exercise_conditions:
+        therapy += [a for a in snapshot.medical_exercises[condition] if a not in therapy]
+    volume = CONDITION_VOLUME if exercise_conditions else 1.0
+
+    plans, cal_goal, prot_goal = book.lookup(inputs.diet, inputs.age, inputs.gender, inputs.activity)
+    avoid = {food for c in inputs.conditions if c in snapshot.medical_diet
+             for food in snapshot.medical_diet[c]["avoid"]}
+    options = [i for i, plan in enumerate(plans) if not any(meal["name"] in avoid for meal in plan.meals)]
+    options = options or list(range(len(plans)))
+
+    first = week_start(start_day)
+    out_weeks = []
+    for w in range(weeks):
+        cycle, step = divmod(w, len(PHASES))
+        phase, extra_sets, extra_reps, kept = PHASES[step]
+        # Carry on through the rotation from last week; the extra step keeps
+        # a week that uses it up exactly from repeating the one before.
+        first_slot = w * (sessions * per_session + 1)
+        week_sessions = []
+        for s in range(sessions):
+            exercises = []
+            for j in range(per_session):
+                ex = allowed[(first_slot + s * per_session + j) % len(allowed)]
+                base_sets, base_reps = _sets_reps(snapshot.exercises[ex]["sets_reps"][group])
+                reps = base_reps + cycle * CYCLE_REPS + extra_reps
+                if extra_reps and done[ex] >= PRACTICED:
+                    reps += PRACTICED_REPS
+                exercises.append([ex, max(1, round((base_sets + extra_sets) * kept * volume)),
+                                  max(1, round(reps * kept))])
+            week_sessions.append({"day": s * 7 // sessions, "exercises": exercises})
+        out_weeks.append({"week": w + 1, "start_day": first + 7 * w, "phase": phase, "sessions": week_sessions,
+                          "meals": [options[(w * 7 + d) % len(options)] if options else None for d in range(7)]})
+    return {"start_day": first, "level": LEVELS[level], "sessions_per_week": sessions,
+            "conditions": list(inputs.conditions), "therapy": therapy[:THERAPY_PER_SESSION],
+            "calorie_goal": cal_goal, "protein_goal": prot_goal,
+            "menus": [[meal["name"] for meal in plan.meals] for plan in plans], "weeks": out_weeks}
+
+
+def day_of(program, day):
+    """(week, session or None on a rest day, meal option) for ``day``, or None outside the program."""
+    for week in program["weeks"]:
+        offset = day - week["start_day"]
+        if 0 <= offset < 7:
+            session = next((s for s in week["sessions"] if s["day"] == offset), None)
+            return week, session, week["meals"][offset]
+    return None
+
+
+# -- batch job --------------------------------------------------------------
+
+_PROFILE_SQL = '''SELECT u.id, u.age, u.gender, u.activity, u.diet, u.medical_conditions, p.start_day, p.weeks
+    FROM users u LEFT JOIN user_plans p ON p.user_id = u.id
+    WHERE u.id BETWEEN ? AND ? AND u.age IS NOT NULL'''
+_HISTORY_SQL = "SELECT day, exercise FROM daily_track WHERE user_id=? AND day>=? AND day<? AND completed=1"
+
+_UPSERT_SQL = '''INSERT INTO user_plans (user_id, start_day, weeks, catalog_version, generated_at, plan)
+    VALUES (?,?,?,?,?,?)
+    ON CONFLICT (user_id) DO UPDATE SET start_day=excluded.start_day, weeks=excluded.weeks,
+        catalog_version=excluded.catalog_version, generated_at=excluded.generated_at, plan=excluded.plan'''
+
+
+def _valid(row):
+    _, age, gender, activity, diet = row[:5]
+    return isinstance(age, int) and gender in GENDERS and activity in ACTIVITY_LEVELS and diet in DIETS
+
+
+def build_users(conn, first_id, last_id, start_day, weeks=WEEKS):
+    """(rows for _UPSERT_SQL, users skipped) for users with first_id <= id <= last_id."""
+    snapshot = catalog.current()
+    book = plan_book()
+    generated = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    built = week_start(start_day)
+    rows, skipped = [], 0
+    for row in conn.execute(_PROFILE_SQL, (first_id, last_id)).fetchall():
+        if not _valid(row):
+            skipped += 1
+            continue
+        user_id, age, gender, activity, diet, conditions, current_start, current_weeks = row
+        # Keep the first week of a program that is still running.
+        start = built
+        if current_start is not None and current_start <= built < current_start + 7 * current_weeks:
+            start = current_start
+        history = conn.execute(_HISTORY_SQL, (user_id, built - HISTORY_DAYS, built)).fetchall()
+        inputs = Inputs(user_id, age, gender, activity, diet, parse_conditions(conditions, snapshot.conditions),
+                        history)
+        program = build_program(inputs, snapshot, book, start, weeks)
+        rows.append((user_id, start, weeks, snapshot.version, generated,
+                     json.dumps(program, separators=(",", ":"))))
+    return rows, skipped
+
+
+def refresh(pool, user_id, day=None, weeks=WEEKS):
+    """Rebuild one user's program now (for example after a profile change)."""
+    day = today() if day is None else day
+    with pool.connection() as conn:
+        rows, _ = build_users(conn, user_id, user_id, day, weeks)
+    if rows:
+        with pool.transaction() as conn:
+            conn.executemany(_UPSERT_SQL, rows)
+
+
+def load(pool, user_id):
+    """The stored program for ``user_id`` as a dict, or None."""
+    rows = pool.execute("SELECT plan FROM user_plans WHERE user_id=?", (user_id,))
+    return json.loads(rows[0][0]) if rows else None
+
+
+_worker = {}
+
+
+def _init_worker(path, start_day, weeks):
+    conn = connect(path)
+    conn.execute("PRAGMA query_only=ON")
+    _worker.update(conn=conn, start_day=start_day, weeks=weeks)
+
+
+def _build_range(bounds):
+    return build_users(_worker["conn"], *bounds, _worker["start_day"], _worker["weeks"])
+
+
+class RunResult:
+    def __init__(self):
+        self.users = 0
+        self.skipped = 0
+        self.workers = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        rate = self.users / self.seconds if self.seconds else 0
+        return (f"RunResult(users={self.users}, skipped={self.skipped}, workers={self.workers}, "
+                f"{self.seconds:.1f}s, {rate:,.0f} users/s)")
+
+
+def _ranges(pool, chunk):
+    ids = [row[0] for row in pool.execute("SELECT id FROM users WHERE age IS NOT NULL ORDER BY id")]
+    return [(ids[i], ids[min(i + chunk, len(ids)) - 1]) for i in range(0, len(ids), chunk)]
+
+
+def run(path=DB_PATH, weeks=WEEKS, workers=None, day=None, chunk=CHUNK_USERS, progress=None):
+    """Build and store programs for every user with a profile; returns a RunResult.
+
+    ``workers`` defaults to the number of CPUs; 0 builds in this process.
+    """
+    day = today() if day is None else day
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    result = RunResult()
+    result.workers = workers
+    started = time.perf_counter()
+    pool = ConnectionPool(path, size=1)
+    try:
+        migrate(pool)
+        ranges = _ranges(pool, chunk)
+
+        def store(rows, skipped):
+            with pool.transaction() as conn:
+                conn.executemany(_UPSERT_SQL, rows)
+            result.users += len(rows)
+            result.skipped += skipped
+            if progress:
+                progress(result)
+
+        if workers == 0:
+            with pool.connection() as conn:
+                for bounds in ranges:
+                    store(*build_users(conn, *bounds, day, weeks))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                        initargs=(path, day, weeks)) as executor:
+                # Write each range as soon as its worker finishes.
+                for future in concurrent.futures.as_completed([executor.submit(_build_range, b) for b in ranges]):
+                    store(*future.result())
+    finally:
+        pool.close()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m health_advisor.programs", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--weeks", type=int, default=WEEKS)
+    parser.add_argument("--workers", type=int, help="processes (default: one per CPU; 0 runs in-process)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_USERS, help="users per task")
+    parser.add_argument("--date", type=datetime.date.fromisoformat, help="build as of YYYY-MM-DD (default today)")
+    args = parser.parse_args(argv)
+    if args.weeks < 1 or args.chunk < 1:
+        parser.error("--weeks and --chunk must be positive")
+    day = None if args.date is None else day_number(args.date)
+    result = run(args.db, args.weeks, args.workers, day, args.chunk,
+                 lambda r: print(f"  {r.users:,} users", end="\r", flush=True))
+    print(f"{result!r}" + " " * 20)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Per-user calorie/exercise rollups, maintained incrementally on every insert.
+
+``daily_rollup`` holds one row per (user, day); ``period_rollup`` holds the
+same totals bucketed by ISO week (starting Monday) and calendar month. Every
+bucket is keyed by the day number of its first day, so any history view is a
+primary-key range read no matter how many raw rows sit behind it.
+
+Run ``python -m health_advisor.rollups --verify|--rebuild path/to/db`` to check
+the rollups against daily_track or recompute them from scratch.
+"""
+import argparse
+
+from .db import ConnectionPool
+from .dates import month_start, week_start
+
+CREATE_TABLES = (
+    '''CREATE TABLE IF NOT EXISTS daily_rollup (
+        user_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        calories INTEGER NOT NULL,
+        exercises INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS period_rollup (
+        user_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        start_day INTEGER NOT NULL,
+        calories INTEGER NOT NULL,
+        exercises INTEGER NOT NULL,
+        PRIMARY KEY (user_id, period, start_day)
+    ) WITHOUT ROWID''',
+)
+
+# SQL forms of dates.week_start and dates.month_start.
+_WEEK_START_SQL = "day - (day + 3) % 7"
+_MONTH_START_SQL = "CAST(julianday(date(day * 86400, 'unixepoch', 'start of month')) - 2440587.5 AS INTEGER)"
+
+
+def apply(conn, user_id, day, calories, exercises=1):
+    """Add one day's delta to every bucket; call inside the insert's transaction."""
+    apply_many(conn, {(user_id, day): (calories, exercises)})
+
+
+def apply_many(conn, deltas):
+    """Like apply() for a whole batch: ``deltas`` maps (user_id, day) -> (calories, exercises)."""
+    periods = {}
+    for (user_id, day), (calories, exercises) in deltas.items():
+        for key in ((user_id, "week", week_start(day)), (user_id, "month", month_start(day))):
+            prev = periods.get(key, (0, 0))
+            periods[key] = (prev[0] + calories, prev[1] + exercises)
+    conn.executemany('''INSERT INTO daily_rollup (user_id, day, calories, exercises) VALUES (?,?,?,?)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            calories = calories + excluded.calories, exercises = exercises + excluded.exercises''',
+                     [(u, d, cal, n) for (u, d), (cal, n) in deltas.items()])
+    conn.executemany('''INSERT INTO period_rollup (user_id, period, start_day, calories, exercises) VALUES (?,?,?,?,?)
+        ON CONFLICT (user_id, period, start_day) DO UPDATE SET
+            calories = calories + excluded.calories, exercises = exercises + excluded.exercises''',
+                     [(u, p, d, cal, n) for (u, p, d), (cal, n) in periods.items()])
+
+
+def history(pool, user_id, period, since_day):
+    """(start_day, calories, exercises) per bucket from ``since_day`` onwards."""
+    if period == "day":
+        return pool.execute("SELECT day, calories, exercises FROM daily_rollup "
+                            "WHERE user_id=? AND day>=? ORDER BY day", (user_id, since_day))
+    starts = {"week": week_start, "month": month_start}[period]
+    return pool.execute("SELECT start_day, calories, exercises FROM period_rollup "
+                        "WHERE user_id=? AND period=? AND start_day>=? ORDER BY start_day",
+                        (user_id, period, starts(since_day)))
+
+
+def _rebuild(conn, user_ids=None):
+    """Recompute the rollups from daily_track, for every user or just ``user_ids``."""
+    for sql in CREATE_TABLES:
+        conn.execute(sql)
+    only = ""
+    if user_ids is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS rebuild_users (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM rebuild_users")
+        conn.executemany("INSERT OR IGNORE INTO rebuild_users (id) VALUES (?)", ((u,) for u in user_ids))
+        only = " AND user_id IN (SELECT id FROM rebuild_users)"
+    conn.execute("DELETE FROM daily_rollup WHERE 1" + only)
+    conn.execute("DELETE FROM period_rollup WHERE 1" + only)
+    conn.execute(f'''INSERT INTO daily_rollup (user_id, day, calories, exercises)
+        SELECT user_id, day, SUM(calories), COUNT(*) FROM daily_track
+        WHERE completed=1{only} GROUP BY user_id, day''')
+    for period, start_sql in (("week", _WEEK_START_SQL), ("month", _MONTH_START_SQL)):
+        conn.execute(f'''INSERT INTO period_rollup (user_id, period, start_day, calories, exercises)
+            SELECT user_id, ?, {start_sql} AS start_day, SUM(calories), SUM(exercises)
+            FROM daily_rollup WHERE 1{only} GROUP BY user_id, start_day''', (period,))
+
+
+def rebuild(pool):
+    with pool.transaction() as conn:
+        _rebuild(conn)
+
+
+def verify(pool):
+    """Return rows where a rollup disagrees with daily_track; empty means consistent.
+
+    Each row is (table, user_id, period, start_day, stored, expected) where
+    stored/expected are (calories, exercises) tuples or None when missing.
+    """
+    mismatches = []
+    with pool.connection() as conn:
+        # Read both sides from one snapshot so concurrent inserts can't show up
+        # as false mismatches.
+        conn.execute("BEGIN")
+        try:
+            expected = {(u, "day", d): (cal, n) for u, d, cal, n in conn.execute(
+                "SELECT user_id, day, SUM(calories), COUNT(*) FROM daily_track "
+                "WHERE completed=1 GROUP BY user_id, day")}
+            stored = {(u, "day", d): (cal, n) for u, d, cal, n in conn.execute(
+                "SELECT user_id, day, calories, exercises FROM daily_rollup")}
+            stored.update(((u, p, d), (cal, n)) for u, p, d, cal, n in conn.execute(
+                "SELECT user_id, period, start_day, calories, exercises FROM period_rollup"))
+        finally:
+            conn.execute("COMMIT")
+    for (user_id, _, day), (cal, n) in list(expected.items()):
+        for period, starts in (("week", week_start), ("month", month_start)):
+            key = (user_id, period, starts(day))
+            prev = expected.get(key, (0, 0))
+            expected[key] = (prev[0] + cal, prev[1] + n)
+    for key in expected.keys() | stored.keys():
+        if expected.get(key) != stored.get(key):
+            user_id, period, start = key
+            table = "daily_rollup" if period == "day" else "period_rollup"
+            mismatches.append((table, user_id, period, start, stored.get(key), expected.get(key)))
+    return sorted(mismatches, key=lambda m: m[1:4])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", nargs="?", default="health_advisor.db")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--verify", action="store_true", help="compare rollups with daily_track")
+    action.add_argument("--rebuild", action="store_true", help="recompute rollups from daily_track")
+    args = parser.parse_args()
+    pool = ConnectionPool(args.db, size=1)
+    if args.rebuild:
+        rebuild(pool)
+        print(f"{args.db}: rollups rebuilt")
+    else:
+        bad = verify(pool)
+        for row in bad[:50]:
+            print(*row, sep="\t")
+        print(f"{args.db}: {len(bad)} mismatched bucket(s)")
+        raise SystemExit(1 if bad else 0)
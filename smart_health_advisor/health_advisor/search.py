@@ -0,0 +1,143 @@
+"""Server-side typeahead search over medical condition names.
+
+Names are split into normalized tokens: lower-cased, punctuation dropped, a
+plural "s" stripped, and synonyms from the catalog's ``condition_synonyms``
+mapped to one canonical token. So "Migraine"/"Migraines" and "Stroke
+Rehab"/"Stroke Recovery" index identically. A query token matches a name token
+exactly, as a prefix of it (typeahead), or, when neither finds anything, by
+edit distance through a trigram index. Every query token must match; results
+are ranked by match quality and returned a page at a time.
+"""
+import bisect
+import collections
+import functools
+import re
+import threading
+
+SearchPage = collections.namedtuple("SearchPage", "names total offset")
+
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token):
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "is", "us")):
+        return token[:-1]
+    return token
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within(a, b, limit):
+    """True if the edit distance between a and b is at most ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return False
+        prev = cur
+    return prev[-1] <= limit
+
+
+class ConditionIndex:
+    """Immutable search index over a collection of names."""
+
+    def __init__(self, names, synonyms=()):
+        self._canonical = {}
+        for group in synonyms:
+            stems = [_stem(word) for word in group]
+            for stem in stems:
+                self._canonical[stem] = stems[0]
+        self.names = tuple(sorted(names))
+        self._name_tokens = []
+        postings = collections.defaultdict(set)
+        for i, name in enumerate(self.names):
+            stems = self._stems(name)
+            tokens = tuple(self._canonical.get(t, t) for t in stems)
+            self._name_tokens.append(tokens)
+            # Index the word as written too, so typeahead prefixes of a
+            # synonym ("recov") still find it.
+            for token in tokens + stems:
+                postings[token].add(i)
+        self._postings = {t: frozenset(ids) for t, ids in postings.items()}
+        self._sorted_tokens = sorted(self._postings)
+        grams = collections.defaultdict(set)
+        for token in self._sorted_tokens:
+            for gram in _trigrams(token):
+                grams[gram].add(token)
+        self._grams = grams
+        self.search = functools.lru_cache(maxsize=1024)(self._search)
+
+    @staticmethod
+    def _stems(text):
+        return tuple(map(_stem, _WORD.findall(text.lower().replace("'", ""))))
+
+    def _tokens(self, text):
+        return tuple(self._canonical.get(t, t) for t in self._stems(text))
+
+    def _matches(self, token):
+        """{name id: match quality} for one query token."""
+        found = {}
+        for i in self._postings.get(token, ()):
+            found[i] = EXACT
+        # Prefix matches also catch a token the user is still typing.
+        pos = bisect.bisect_left(self._sorted_tokens, token)
+        while pos < len(self._sorted_tokens) and self._sorted_tokens[pos].startswith(token):
+            for i in self._postings[self._sorted_tokens[pos]]:
+                found.setdefault(i, PREFIX)
+            pos += 1
+        if found or len(token) < 4:
+            return found
+        limit = 1 if len(token) <= 6 else 2
+        candidates = collections.Counter()
+        for gram in _trigrams(token):
+            candidates.update(self._grams.get(gram, ()))
+        for candidate, shared in candidates.items():
+            if shared >= 2 and _within(token, candidate, limit):
+                for i in self._postings[candidate]:
+                    found[i] = FUZZY
+        return found
+
+    def _search(self, query, limit=20, offset=0):
+        tokens = self._tokens(query)
+        if not tokens:
+            return SearchPage(self.names[offset:offset + limit], len(self.names), offset)
+        scores = None
+        for token in tokens:
+            found = self._matches(token)
+            if scores is None:
+                scores = found
+            else:
+                scores = {i: s + found[i] for i, s in scores.items() if i in found}
+            if not scores:
+                return SearchPage((), 0, offset)
+        # Best match first; among equals prefer shorter names, then alphabetical.
+        ranked = sorted(scores, key=lambda i: (-scores[i], len(self._name_tokens[i]), i))
+        return SearchPage(tuple(self.names[i] for i in ranked[offset:offset + limit]), len(ranked), offset)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def condition_index(snapshot, kind):
+    """Index over ``snapshot.medical_exercises`` or ``snapshot.medical_diet`` names, built once per catalog version."""
+    key = (snapshot.version, kind)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = ConditionIndex(getattr(snapshot, kind), snapshot.condition_synonyms)
+                for stale in [k for k in _indexes if k[0] != snapshot.version]:
+                    del _indexes[stale]
+                _indexes[key] = index
+    return index
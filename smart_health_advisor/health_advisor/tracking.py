@@ -0,0 +1,45 @@
+"""Exercise tracking queries, keyed by users.id and day number."""
+from . import rollups
+from .dates import today
+
+
+def insert_events(conn, events):
+    """Insert (user_id, exercise, calories, day, event_key) rows and update the rollups.
+
+    Events whose key is already stored are skipped. Returns the events that
+    were actually inserted; call inside a transaction.
+    """
+    inserted = []
+    deltas = {}
+    for event in events:
+        user_id, exercise, calories, day, key = event
+        cursor = conn.execute('''INSERT INTO daily_track (user_id,exercise,calories,completed,day,event_key)
+            VALUES (?,?,?,1,?,?) ON CONFLICT (event_key) WHERE event_key IS NOT NULL DO NOTHING''',
+                              (user_id, exercise, calories, day, key))
+        if cursor.rowcount:
+            inserted.append(event)
+            prev = deltas.get((user_id, day), (0, 0))
+            deltas[(user_id, day)] = (prev[0] + calories, prev[1] + 1)
+    rollups.apply_many(conn, deltas)
+    return inserted
+
+
+def record_exercise(pool, user_id, exercise, calories, day=None, key=None):
+    """Insert one completed exercise now; returns False if ``key`` was already recorded."""
+    day = today() if day is None else day
+    with pool.transaction() as conn:
+        return bool(insert_events(conn, [(user_id, exercise, calories, day, key)]))
+
+
+def exercises_on(pool, user_id, day):
+    return pool.execute("SELECT exercise, calories FROM daily_track WHERE user_id=? AND day=? AND completed=1",
+                        (user_id, day))
+
+
+def stored_keys(pool, keys):
+    """The subset of ``keys`` already present in daily_track."""
+    keys = list(keys)
+    if not keys:
+        return set()
+    marks = ",".join("?" * len(keys))
+    return {k for (k,) in pool.execute(f"SELECT event_key FROM daily_track WHERE event_key IN ({marks})", keys)}
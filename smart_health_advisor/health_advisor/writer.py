@@ -0,0 +1,196 @@
+"""Write-behind queue for exercise tracking events.
+
+``submit()`` only appends the event to an in-memory queue and returns; a
+background thread drains the queue and commits everything that arrived in
+one transaction (group commit), so a click never waits on SQLite and a burst
+of clicks costs one commit instead of one each.
+
+An event can carry an idempotency key. A key that is already queued is
+refused at ``submit()``, and one that is already stored is skipped by the
+insert (see tracking.insert_events), so double clicks, reruns and retried API
+calls are recorded once. Events without a key are stored with a NULL
+event_key. Until an event is committed it is visible through ``pending()``,
+which HealthAdvisor overlays on its reads so a session sees its own writes
+immediately.
+
+A batch that keeps failing on a locked or unwritable database is retried
+MAX_ATTEMPTS times, then logged and dropped (``dropped`` counts the events).
+The queue holds at most ``max_queue`` events; past that ``submit()`` raises
+QueueFull rather than letting memory grow while the database is stuck.
+
+``close()`` (also run at interpreter exit) drains the queue, commits and
+checkpoints the WAL before returning.
+"""
+import atexit
+import collections
+import contextlib
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+from . import tracking
+
+log = logging.getLogger(__name__)
+
+Event = collections.namedtuple("Event", "user_id exercise calories day key")
+
+# Most events committed in one transaction.
+MAX_BATCH = 1000
+# How long the writer waits for more events after the first one arrives.
+MAX_DELAY = 0.02
+# Most events queued or being written at once.
+MAX_QUEUE = 100_000
+# Backoff while the database stays locked.
+RETRY_DELAY = 0.1
+# Attempts per batch before its events are dropped; each one can also wait
+# out the connection's busy timeout.
+MAX_ATTEMPTS = 50
+
+
+class QueueFull(sqlite3.OperationalError):
+    """Raised by submit() while the writer is too far behind to take more events."""
+
+
+class WriteBehind:
+    def __init__(self, pool, max_batch=MAX_BATCH, max_delay=MAX_DELAY, max_queue=MAX_QUEUE):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        # Held across each COMMIT and the removal of its events from
+        # _pending, and while a reader pins its snapshot in pending().
+        self._visible = threading.Lock()
+        # (pending key, Event) pairs.
+        self._queue = collections.deque()
+        # pending key -> Event for everything queued or being written. The
+        # pending key is the event's key, or a local number for one without.
+        self._pending = {}
+        self._local_keys = itertools.count()
+        self._submitted = 0
+        self._done = 0
+        # Events given up on: failed MAX_ATTEMPTS times or rejected by a constraint.
+        self.dropped = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tracking-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id, exercise, calories, day, key=None):
+        """Queue one event; returns False if an event with ``key`` is already queued.
+
+        Raises QueueFull when ``max_queue`` events are still waiting.
+        """
+        event = Event(user_id, exercise, calories, day, key)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            pending_key = next(self._local_keys) if key is None else key
+            if pending_key in self._pending:
+                return False
+            if len(self._pending) >= self.max_queue:
+                raise QueueFull(f"{len(self._pending)} tracking writes are still waiting for the database")
+            self._pending[pending_key] = event
+            self._queue.append((pending_key, event))
+            self._submitted += 1
+            self._cond.notify_all()
+        return True
+
+    def pending(self, user_id, first_day, last_day=None, conn=None):
+        """Queued events for ``user_id`` with first_day <= day <= last_day.
+
+        Pass ``conn`` in a transaction that has not read anything yet to pin
+        its snapshot at the same moment: each returned event is missing from
+        the snapshot, and every event committed earlier is in it.
+        """
+        last_day = first_day if last_day is None else last_day
+        with self._visible:
+            if conn is not None:
+                conn.execute("SELECT 1 FROM daily_track LIMIT 1").fetchall()
+            with self._cond:
+                return [e for e in self._pending.values()
+                        if e.user_id == user_id and first_day <= e.day <= last_day]
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is committed; returns False on timeout."""
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._done >= target or not self._thread.is_alive(), timeout)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("PRAGMA wal_checkpoint(FULL)")
+        except sqlite3.Error as e:
+            log.warning("checkpoint after final flush failed: %s", e)
+
+    def _next_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closed)
+            if not self._queue:
+                return None
+            if len(self._queue) < self.max_batch and not self._closed:
+                # Let a burst accumulate so it shares one commit.
+                self._cond.wait_for(lambda: len(self._queue) >= self.max_batch or self._closed, self.max_delay)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _retire(self, batch):
+        """Drop committed or abandoned (pending key, Event) pairs from _pending."""
+        with self._cond:
+            for pending_key, event in batch:
+                if self._pending.get(pending_key) is event:
+                    del self._pending[pending_key]
+                    self._done += 1
+            self._cond.notify_all()
+
+    def _write(self, batch):
+        failures = 0
+        while True:
+            try:
+                with contextlib.ExitStack() as visible:
+                    with self.pool.transaction() as conn:
+                        tracking.insert_events(conn, [event for _, event in batch])
+                        # Commit and retire as one step for pending(conn=...).
+                        visible.enter_context(self._visible)
+                    self._retire(batch)
+                return
+            except sqlite3.IntegrityError:
+                # Isolate the offending events instead of losing the batch.
+                if len(batch) == 1:
+                    log.exception("dropping tracking event %s", batch[0][1])
+                    self.dropped += 1
+                    return
+                for pair in batch:
+                    self._write([pair])
+                return
+            except sqlite3.OperationalError as e:
+                failures += 1
+                # Give up eventually rather than retry (and queue up behind
+                # this batch) forever, or hang the exit during shutdown.
+                if failures >= MAX_ATTEMPTS:
+                    log.error("dropping %d tracking events after %d attempts: %s", len(batch), failures, e)
+                    self.dropped += len(batch)
+                    return
+                log.warning("tracking write failed, retrying: %s", e)
+                time.sleep(RETRY_DELAY)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                log.exception("tracking writer failed on a batch of %d events", len(batch))
+            # Whatever _write did not commit is given up on.
+            self._retire(batch)
@@ -0,0 +1,43 @@
+"""Run the app with long-lived cache headers on its optimized 3D models.
+
+    streamlit run serve.py
+
+Streamlit serves ./static at app/static/ without any Cache-Control header, so
+browsers revalidate or re-download every model on each visit. Model and
+poster URLs from health_advisor.assets carry a ``?v=<content hash>`` query and
+change whenever the file does, so responses for them are marked cacheable for
+a year and immutable. Everything else is passed through untouched;
+``streamlit run smart_health_advisor.py`` still works, just without the header.
+"""
+import os
+
+import streamlit as st
+from starlette.middleware import Middleware
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "smart_health_advisor.py")
+MODELS_PATH = "/app/static/models/"
+IMMUTABLE = b"public, max-age=31536000, immutable"
+
+
+class ImmutableModels:
+    """ASGI middleware adding IMMUTABLE to successful, versioned model responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or MODELS_PATH not in scope["path"]
+                or b"v=" not in scope.get("query_string", b"")):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_cached(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"cache-control"]
+                message = {**message, "headers": headers + [(b"cache-control", IMMUTABLE)]}
+            await send(message)
+
+        await self.app(scope, receive, send_cached)
+
+
+app = st.App(SCRIPT, middleware=[Middleware(ImmutableModels)])
@@ -1,354 +1,320 @@
 import streamlit as st
+import collections
 import sqlite3
 import pandas as pd
-import datetime
-import streamlit.components.v1 as components
 import altair as alt
+from health_advisor import metrics
+from health_advisor.assets import model_assets
+from health_advisor.core import HISTORY_VIEWS, HealthAdvisor
+from health_advisor.dates import from_day_number, today as today_number
+from health_advisor.nutrition import ACTIVITY_LEVELS, DIETS, GENDERS
+from health_advisor.profiles import normalize_name
 
 # ------------------------------
 # ------------------------------
 # DATABASE SETUP
 # ------------------------------
-conn = sqlite3.connect('health_advisor.db', check_same_thread=False)
-c = conn.cursor()
-
-# Create tables if not exist
-c.execute('''CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    age INTEGER,
-    gender TEXT,
-    activity TEXT,
-    diet TEXT
-)''')
-
-c.execute('''CREATE TABLE IF NOT EXISTS daily_track (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT,
-    exercise TEXT,
-    calories INT,
-    completed BOOLEAN,
-    date TEXT
-)''')
-conn.commit()
+# One HealthAdvisor (and connection pool) per process, shared by every
+# session; each query checks out its own connection so concurrent sessions
+# never share a cursor. All app logic lives in health_advisor.core.
+@st.cache_resource
+def get_advisor():
+    return HealthAdvisor.open()
 
-# ------------------------------
-# EXERCISES & FOODS DATABASE
-# ------------------------------
-exercises = {
-    "Push-up": {"category": "Chest", "level": "Beginner", "muscles": "Chest, Triceps, Shoulders", "calories":50, "animation":"animations/pushup.glb", "emoji":"💪", "sets_reps":{"10-17":"3x10","18-29":"4x15","30-49":"3x12","50+":"2x10"}},
-    "Lat Pulldown": {"category": "Back", "level": "Intermediate", "muscles": "Lats, Biceps, Rear Delts","calories":70, "animation":"animations/latpulldown.glb", "emoji":"🏋️", "sets_reps":{"10-17":"3x10","18-29":"4x12","30-49":"3x10","50+":"2x8"}},
-    "T-bar Row": {"category": "Back", "level": "Advanced", "muscles": "Lats, Traps, Rhomboids","calories":80, "animation":"animations/tbarrow.glb", "emoji":"🏋️‍♂️", "sets_reps":{"10-17":"3x8","18-29":"4x10","30-49":"3x8","50+":"2x6"}},
-    "Squat": {"category": "Legs", "level": "Intermediate", "muscles": "Quads, Glutes, Hamstrings","calories":60, "animation":"animations/squat.glb", "emoji":"🦵", "sets_reps":{"10-17":"3x15","18-29":"4x20","30-49":"3x15","50+":"2x12"}},
-    "Bicep Curl": {"category": "Arms", "level": "Beginner", "muscles": "Biceps","calories":40, "animation":"animations/bicepcurl.glb", "emoji":"💪", "sets_reps":{"10-17":"3x12","18-29":"4x15","30-49":"3x12","50+":"2x10"}},
-}
-
-foods = {
-    # Breakfast
-    "Oats": {"type":"Vegetarian","meal":"Breakfast","calories":150,"protein":5,"emoji":"🥣"},
-    "Egg Omelette": {"type":"Non-Vegetarian","meal":"Breakfast","calories":200,"protein":12,"emoji":"🥚"},
-    "Yogurt": {"type":"Vegetarian","meal":"Breakfast","calories":120,"protein":8,"emoji":"🥛"},
-    # Lunch
-    "Grilled Chicken": {"type":"Non-Vegetarian","meal":"Lunch","calories":250,"protein":25,"emoji":"🍗"},
-    "Paneer Curry": {"type":"Vegetarian","meal":"Lunch","calories":300,"protein":18,"emoji":"🧀"},
-    "Chicken Salad": {"type":"Non-Vegetarian","meal":"Lunch","calories":220,"protein":20,"emoji":"🥗"},
-    # Dinner
-    "Salad": {"type":"Vegetarian","meal":"Dinner","calories":100,"protein":3,"emoji":"🥗"},
-    "Grilled Fish": {"type":"Non-Vegetarian","meal":"Dinner","calories":230,"protein":22,"emoji":"🐟"},
-    # Snacks
-    "Protein Shake": {"type":"Vegetarian","meal":"Snack","calories":180,"protein":20,"emoji":"🥤"},
-    "Nuts Mix": {"type":"Vegetarian","meal":"Snack","calories":200,"protein":6,"emoji":"🥜"},
-}
+advisor = get_advisor()
 
-level_colors = {"Beginner":"#4CAF50", "Intermediate":"#FF9800", "Advanced":"#F44336"}
+# Opt-in instrumentation (HEALTH_ADVISOR_METRICS=1): every section below is
+# timed, and SQL is profiled by the pool's connections. See health_advisor.metrics.
+@st.cache_resource
+def start_metrics_server():
+    return metrics.serve(metrics.PORT) if metrics.ENABLED and metrics.PORT else None
+
+start_metrics_server()
+show_admin = metrics.admin_allowed(st.query_params.get("admin"))
 
 # ------------------------------
-# MEDICAL CONDITION DATABASE (100+ conditions)
+# CATALOGS (exercises, foods, medical conditions)
 # ------------------------------
-medical_exercises = {
-    "Diabetes": ["Walking 30 mins", "Resistance Band Exercises", "Cycling"],
-    "Hypertension": ["Yoga", "Walking", "Swimming"],
-    "Back Pain": ["Stretching", "Pelvic Tilt", "Cat-Cow Pose"],
-    "Arthritis": ["Low-impact aerobics", "Water Therapy", "Stretching"],
-    "Obesity": ["Treadmill Walking", "Resistance Training", "Cycling"],
-    "Asthma": ["Breathing Exercises", "Yoga", "Walking"],
-    "Osteoporosis": ["Weight-bearing Exercise", "Balance Training", "Resistance Bands"],
-    "High Cholesterol": ["Brisk Walking", "Swimming", "Jogging"],
-    "Depression": ["Yoga", "Cardio Exercise", "Meditation"],
-    "Anxiety": ["Breathing Exercises", "Stretching", "Walking"],
-    "Migraines": ["Yoga", "Neck Stretches", "Light Cardio"],
-    "Insomnia": ["Meditation", "Light Stretching", "Walking"],
-    "PCOS": ["Strength Training", "Cardio", "Pilates"],
-    "Thyroid Issues": ["Brisk Walking", "Resistance Training", "Yoga"],
-    "Kidney Disease": ["Walking", "Low-impact Aerobics", "Stretching"],
-    "Heart Disease": ["Brisk Walking", "Swimming", "Cycling"],
-    "COPD": ["Breathing Exercises", "Yoga", "Walking"],
-    "IBS": ["Yoga", "Walking", "Light Strength Training"],
-    "Anemia": ["Walking", "Resistance Band Exercises", "Yoga"],
-    "Gout": ["Walking", "Stretching", "Low-impact Cardio"],
-    "Fibromyalgia": ["Stretching", "Yoga", "Swimming"],
-    "Hyponatremia": ["Walking", "Yoga", "Low-impact Aerobics"],
-    "Hypernatremia": ["Walking", "Stretching", "Yoga"],
-    "Constipation": ["Walking", "Yoga", "Pelvic Floor Exercises"],
-    "Acid Reflux": ["Walking", "Light Cardio", "Stretching"],
-    "COPD": ["Breathing Exercises", "Yoga", "Walking"],
-    "Multiple Sclerosis": ["Stretching", "Balance Training", "Water Therapy"],
-    "Parkinson's": ["Balance Exercises", "Walking", "Yoga"],
-    "Stroke Recovery": ["Physiotherapy Exercises", "Walking", "Stretching"],
-    "Scoliosis": ["Stretching", "Pilates", "Core Strengthening"],
-    "Hernia": ["Walking", "Breathing Exercises", "Low-impact Core Workouts"],
-    "Pregnancy": ["Prenatal Yoga", "Walking", "Pelvic Floor Exercises"],
-    "Postpartum": ["Pelvic Floor Exercises", "Walking", "Light Strength Training"],
-    "Menopause": ["Walking", "Yoga", "Strength Training"],
-    "Eczema": ["Light Yoga", "Walking", "Stretching"],
-    "Psoriasis": ["Swimming", "Walking", "Yoga"],
-    "Lupus": ["Stretching", "Walking", "Yoga"],
-    "Rheumatoid Arthritis": ["Water Therapy", "Stretching", "Low-impact Cardio"],
-    "Celiac Disease": ["Walking", "Yoga", "Resistance Bands"],
-    "Ulcerative Colitis": ["Walking", "Yoga", "Stretching"],
-    "Crohn's Disease": ["Walking", "Yoga", "Light Strength Training"],
-    "Migraine": ["Yoga", "Stretching", "Walking"],
-    "Hypertension Stage 2": ["Brisk Walking", "Cycling", "Yoga"],
-    "Heart Failure": ["Walking", "Yoga", "Light Resistance Training"],
-    "Stroke": ["Physiotherapy Exercises", "Walking", "Stretching"],
-    "Kidney Stones": ["Walking", "Yoga", "Hydration-focused Exercises"],
-    "Liver Disease": ["Walking", "Stretching", "Yoga"],
-    "Pancreatitis": ["Walking", "Yoga", "Light Strength Training"],
-    "Gallstones": ["Walking", "Stretching", "Yoga"],
-    "Hypoglycemia": ["Walking", "Resistance Band Exercises", "Yoga"],
-    "Hyperglycemia": ["Walking", "Cycling", "Yoga"],
-    "High Triglycerides": ["Walking", "Cycling", "Resistance Training"],
-    "Low HDL": ["Walking", "Swimming", "Resistance Training"],
-    "Obstructive Sleep Apnea": ["Breathing Exercises", "Walking", "Yoga"],
-    "Insulin Resistance": ["Walking", "Strength Training", "Yoga"],
-    "Gestational Diabetes": ["Walking", "Prenatal Yoga", "Resistance Bands"],
-    "Varicose Veins": ["Walking", "Stretching", "Leg Elevation Exercises"],
-    "Deep Vein Thrombosis": ["Walking", "Leg Strength Exercises", "Stretching"],
-    "Stroke Prevention": ["Walking", "Yoga", "Resistance Training"],
-    "Atrial Fibrillation": ["Walking", "Yoga", "Light Cardio"],
-    "Heart Attack Recovery": ["Walking", "Yoga", "Physiotherapy Exercises"],
-    "Peripheral Artery Disease": ["Walking", "Stretching", "Low-impact Cardio"],
-    "Chronic Fatigue Syndrome": ["Walking", "Stretching", "Yoga"],
-    "Lyme Disease": ["Stretching", "Walking", "Yoga"],
-    "Alzheimer's": ["Walking", "Balance Exercises", "Light Strength Training"],
-    "Dementia": ["Walking", "Yoga", "Stretching"],
-    "Parkinsonism": ["Balance Training", "Walking", "Yoga"],
-    "Epilepsy": ["Walking", "Stretching", "Yoga"],
-    "Hypotension": ["Walking", "Resistance Band Exercises", "Stretching"],
-    "Hyperthyroidism": ["Walking", "Yoga", "Strength Training"],
-    "Hypothyroidism": ["Walking", "Resistance Training", "Yoga"],
-    "Osteoarthritis": ["Stretching", "Water Therapy", "Walking"],
-    "Spondylitis": ["Stretching", "Yoga", "Walking"],
-    "Sciatica": ["Stretching", "Walking", "Core Strengthening"],
-    "Tendonitis": ["Stretching", "Resistance Bands", "Yoga"],
-    "Bursitis": ["Stretching", "Water Therapy", "Walking"],
-    "Carpal Tunnel": ["Stretching", "Yoga", "Resistance Bands"],
-    "Frozen Shoulder": ["Stretching", "Resistance Bands", "Light Strength Training"],
-    "Knee Pain": ["Stretching", "Cycling", "Strength Training"],
-    "Hip Pain": ["Stretching", "Walking", "Water Therapy"],
-    "Ankle Sprain": ["Stretching", "Resistance Bands", "Balance Exercises"],
-    "Plantar Fasciitis": ["Stretching", "Yoga", "Walking"],
-    "Tennis Elbow": ["Stretching", "Resistance Bands", "Yoga"],
-    "Golfer Elbow": ["Stretching", "Resistance Bands", "Yoga"],
-    "Car Accident Recovery": ["Physiotherapy Exercises", "Stretching", "Walking"],
-    "Post-Surgery Rehab": ["Physiotherapy Exercises", "Walking", "Stretching"],
-    "Burn Recovery": ["Stretching", "Walking", "Physiotherapy Exercises"],
-    "Stroke Rehab": ["Physiotherapy Exercises", "Walking", "Stretching"],
-    "Amputation Rehab": ["Stretching", "Resistance Bands", "Walking"],
-    "Traumatic Brain Injury": ["Walking", "Stretching", "Yoga"],
-    "Spinal Cord Injury": ["Physiotherapy Exercises", "Stretching", "Wheelchair Exercises"],
-    "Multiple Injuries": ["Physiotherapy Exercises", "Stretching", "Walking"],
-    "General Fitness": ["Walking", "Yoga", "Strength Training"],
-    "Weight Loss": ["Brisk Walking", "Cycling", "Strength Training"],
-    "Muscle Gain": ["Strength Training", "Resistance Bands", "Weightlifting"],
-}
-
-medical_diet = {
-    "Diabetes": {"eat":["Oats","Vegetables","Chicken"], "avoid":["Sugar","Sweet Drinks","Refined Flour"]},
-    "Hypertension": {"eat":["Fruits","Vegetables","Oats"], "avoid":["Salt","Processed Foods","Canned Items"]},
-    "Back Pain": {"eat":["Calcium-rich Foods","Leafy Greens"], "avoid":["High Sugar Foods","Soft Drinks"]},
-    "Arthritis": {"eat":["Fatty Fish","Fruits","Vegetables"], "avoid":["Red Meat","Processed Foods","Sugar"]},
-    "Obesity": {"eat":["Vegetables","Fruits","Lean Proteins"], "avoid":["Fried Foods","Sugary Drinks","Fast Food"]},
-    "Asthma": {"eat":["Fruits","Vegetables","Omega-3 rich foods"], "avoid":["Dairy (if sensitive)","Processed Foods","Allergens"]},
-    "Osteoporosis": {"eat":["Dairy","Leafy Greens","Almonds"], "avoid":["Excess Salt","Caffeine","Carbonated Drinks"]},
-    "High Cholesterol": {"eat":["Oats","Nuts","Fish"], "avoid":["Fried Foods","Red Meat","Trans Fats"]},
-    "Depression": {"eat":["Leafy Greens","Fatty Fish","Whole Grains"], "avoid":["Sugary Foods","Processed Foods","Excess Alcohol"]},
-    "Anxiety": {"eat":["Chamomile Tea","Leafy Greens","Oats"], "avoid":["Caffeine","Sugar","Alcohol"]},
-    # Add the rest 90+ diet rules similarly
-}
+# Loaded once per process from data/catalog.json and shared by every session;
+# edits to the file are picked up without a restart.
+catalog_snapshot = advisor.catalog
+exercises = catalog_snapshot.exercises
+
+level_colors = {"Beginner":"#4CAF50", "Intermediate":"#FF9800", "Advanced":"#F44336"}
 
 # ------------------------------
 # HEADER
 # ------------------------------
-st.markdown("""
-<div style='background: linear-gradient(to right,#00c6ff,#0072ff); padding:25px; border-radius:15px;'>
-<h1 style='text-align:center; color:#f0f0f0;'>Smart Health Advisor 💪</h1>
-<p style='text-align:center; color:#f0f0f0;'>Personalized Workouts, Diet Plans, Medical Guidance & Weekly Progress</p>
-</div>
-""", unsafe_allow_html=True)
-st.markdown("<br>", unsafe_allow_html=True)
+with metrics.section("header"):
+    st.markdown("""
+    <div style='background: linear-gradient(to right,#00c6ff,#0072ff); padding:25px; border-radius:15px;'>
+    <h1 style='text-align:center; color:#f0f0f0;'>Smart Health Advisor 💪</h1>
+    <p style='text-align:center; color:#f0f0f0;'>Personalized Workouts, Diet Plans, Medical Guidance & Weekly Progress</p>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("<br>", unsafe_allow_html=True)
 
 # ------------------------------
 # TABS
 # ------------------------------
-tab_profile, tab_workout, tab_diet, tab_progress, tab_med_exercise, tab_med_diet = st.tabs(
-    ["Profile & BMI", "Workout Plan", "Diet Plan", "Progress Tracker", "Medical Exercises", "Medical Diet"]
-)
+tab_names = ["Profile & BMI", "Workout Plan", "Diet Plan", "Progress Tracker", "Medical Exercises", "Medical Diet"]
+if show_admin:
+    tab_names.append("⚙️ Admin")
+# Only the open tab runs: switching tabs reruns the app with the new tab open
+# and every other tab's body skipped, so the first render costs one tab.
+tabs = st.tabs(tab_names, key="active_tab", on_change="rerun")
+tab_profile, tab_workout, tab_diet, tab_progress, tab_med_exercise, tab_med_diet = tabs[:6]
 
 # ------------------------------
-# HELPER FUNCTIONS
+# FRAGMENTS
 # ------------------------------
-def age_group(age):
-    if age<18: return "10-17"
-    elif age<30: return "18-29"
-    elif age<50: return "30-49"
-    else: return "50+"
-
-def get_nutrition_goals(age, gender, activity):
-    group = age_group(age)
-    cal_base = {"10-17":2000, "18-29":2400, "30-49":2200, "50+":2000}
-    prot_base = {"10-17":50, "18-29":70, "30-49":60, "50+":50}
-    if gender=="Male":
-        cal_base = {k:int(v*1.1) for k,v in cal_base.items()}
-        prot_base = {k:int(v*1.1) for k,v in prot_base.items()}
-    multiplier = {"Sedentary":0.9,"Light":1.0,"Moderate":1.2,"Very Active":1.4}
-    cal_goal = int(cal_base[group]*multiplier[activity])
-    prot_goal = int(prot_base[group]*multiplier[activity])
-    return cal_goal, prot_goal
-
-def generate_diet_plan(diet_pref, age, gender, activity):
-    cal_goal, prot_goal = get_nutrition_goals(age, gender, activity)
-    plan=[]
-    total_cal, total_prot = 0,0
-    meals_order = ["Breakfast","Snack","Lunch","Snack","Dinner"]
-    for meal_type in meals_order:
-        for food, info in foods.items():
-            if info["meal"]==meal_type and info["type"]==diet_pref:
-                if total_cal+info["calories"]>cal_goal:
-                    continue
-                plan.append(info)
-                total_cal += info["calories"]
-                total_prot += info["protein"]
-                break
-    return plan, cal_goal, prot_goal
+# Every tab below the profile form is an st.fragment: a click inside a tab
+# reruns only that tab. The profile form itself stays in the main script
+# because every tab depends on it, so changing it reruns the whole app.
+# The one cross-tab dependency (Workout "Mark as done" -> Progress Tracker)
+# needs no tracking: the tracker only runs when its tab is opened, which is a
+# full rerun that reads the current data.
 
 # ------------------------------
 # PROFILE & BMI
 # ------------------------------
-with tab_profile:
-    st.subheader("👤 Your Profile")
-    col1, col2 = st.columns(2)
-    with col1:
-        name = st.text_input("Enter Your Name", key="profile_name")
-        age = st.number_input("Enter Your Age", min_value=10, max_value=100, step=1, key="profile_age")
-    with col2:
-        gender = st.selectbox("Select Gender", ["Male","Female"], key="profile_gender")
-        activity = st.selectbox("Activity Level", ["Sedentary","Light","Moderate","Very Active"], key="profile_activity")
-    diet = st.selectbox("Diet Preference", ["Vegetarian","Non-Vegetarian"], key="profile_diet")
+@st.fragment
+@metrics.timed("bmi")
+def bmi_calculator():
+    st.subheader("⚖️ BMI Calculator")
+    weight = st.number_input("Weight (kg)", key="bmi_weight")
+    height = st.number_input("Height (cm)", key="bmi_height")
+    if st.button("Calculate BMI", key="calc_bmi"):
+        if weight>0 and height>0:
+            bmi = weight / ((height/100)**2)
+            st.write(f"Your BMI: {bmi:.2f}")
+            if bmi<18.5: st.warning("Underweight: Consider calorie-rich diet")
+            elif bmi<24.9: st.success("Normal weight")
+            elif bmi<29.9: st.warning("Overweight: Reduce calories & exercise more")
+            else: st.error("Obese: Consult a health professional")
+        else:
+            st.error("Enter valid weight and height")
+
+def session_profile(name):
+    # (user_id, saved profile or None), read once per session per name and
+    # reused on every rerun until the name changes or the profile is saved.
+    # A name nobody has saved yet is (None, None); typing it creates nothing.
+    # A freshly loaded profile prefills the form widgets below; a name without
+    # one resets them, so it doesn't inherit the previous name's values.
+    cached = st.session_state.get("profile_cache")
+    if cached is None or cached[0] != normalize_name(name):
+        user_id, profile = advisor.load_profile(name)
+        cached = st.session_state["profile_cache"] = (normalize_name(name), user_id, profile)
+        if profile is None:
+            for key, value in PROFILE_DEFAULTS.items():
+                if key != "profile_name":
+                    st.session_state[key] = list(value) if isinstance(value, list) else value
+        # Older rows can hold values the widgets don't offer; leave those alone.
+        allowed = {"age": range(10, 101), "gender": GENDERS, "activity": ACTIVITY_LEVELS, "diet": DIETS}
+        for field, value in (profile or {}).items():
+            if field == "medical_conditions" or value in allowed.get(field, ()):
+                st.session_state[f"profile_{field}"] = value
+    return cached[1], cached[2]
+
+# The profile widgets only exist while their tab is open. Re-assigning their
+# values keeps Streamlit from discarding them on runs where it is closed, and
+# the other tabs read the profile from session state.
+PROFILE_DEFAULTS = {"profile_name": "", "profile_age": 10, "profile_gender": GENDERS[0],
+                    "profile_activity": ACTIVITY_LEVELS[0], "profile_diet": DIETS[0],
+                    "profile_medical_conditions": []}
+for key in PROFILE_DEFAULTS:
+    if key in st.session_state:
+        st.session_state[key] = st.session_state[key]
+
+if tab_profile.open:
+    with tab_profile, metrics.section("profile"):
+        st.subheader("👤 Your Profile")
+        col1, col2 = st.columns(2)
+        with col1:
+            name = st.text_input("Enter Your Name", key="profile_name")
+            user_id, saved_profile = session_profile(name) if name.strip() else (None, None)
+            if saved_profile:
+                st.caption("Loaded your saved profile.")
+            age = st.number_input("Enter Your Age", min_value=10, max_value=100, step=1, key="profile_age")
+        with col2:
+            gender = st.selectbox("Select Gender", ["Male","Female"], key="profile_gender")
+            activity = st.selectbox("Activity Level", ["Sedentary","Light","Moderate","Very Active"], key="profile_activity")
+        diet = st.selectbox("Diet Preference", ["Vegetarian","Non-Vegetarian"], key="profile_diet")
+        conditions = st.multiselect("Medical Conditions", advisor.catalog.conditions, key="profile_medical_conditions",
+                                    help="Your workout and meal program takes these into account.")
     
-    if st.button("Save Profile", key="save_profile") and name:
-        try:
-            c.execute("INSERT INTO users (name, age, gender, activity, diet) VALUES (?,?,?,?,?)",(name,age,gender,activity,diet))
-            conn.commit()
-            st.success(f"Profile for {name} saved successfully!")
-        except sqlite3.OperationalError as e:
-            st.error(f"Database error: {e}")
-
-    if name:
-        st.markdown(f"""
-        <div style='background-color:#003366; color:#f0f0f0; padding:15px; border-radius:10px;'>
-        <b>Name:</b> {name}<br>
-        <b>Age:</b> {age}<br>
-        <b>Gender:</b> {gender}<br>
-        <b>Activity:</b> {activity}<br>
-        <b>Diet:</b> {diet}<br>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # BMI
-        st.subheader("⚖️ BMI Calculator")
-        weight = st.number_input("Weight (kg)", key="bmi_weight")
-        height = st.number_input("Height (cm)", key="bmi_height")
-        if st.button("Calculate BMI", key="calc_bmi"):
-            if weight>0 and height>0:
-                bmi = weight / ((height/100)**2)
-                st.write(f"Your BMI: {bmi:.2f}")
-                if bmi<18.5: st.warning("Underweight: Consider calorie-rich diet")
-                elif bmi<24.9: st.success("Normal weight")
-                elif bmi<29.9: st.warning("Overweight: Reduce calories & exercise more")
-                else: st.error("Obese: Consult a health professional")
-            else:
-                st.error("Enter valid weight and height")
+        if st.button("Save Profile", key="save_profile") and name:
+            try:
+                advisor.save_profile(name, age, gender, activity, diet, conditions)
+                st.session_state.pop("profile_cache", None)
+                st.success(f"Profile for {name} saved successfully!")
+            except ValueError as e:
+                st.error(str(e))
+            except sqlite3.OperationalError as e:
+                st.error(f"Database error: {e}")
+
+        if name:
+            st.markdown(f"""
+            <div style='background-color:#003366; color:#f0f0f0; padding:15px; border-radius:10px;'>
+            <b>Name:</b> {name}<br>
+            <b>Age:</b> {age}<br>
+            <b>Gender:</b> {gender}<br>
+            <b>Activity:</b> {activity}<br>
+            <b>Diet:</b> {diet}<br>
+            <b>Medical Conditions:</b> {", ".join(conditions) or "None"}<br>
+            </div>
+            """, unsafe_allow_html=True)
+            bmi_calculator()
+else:
+    name = st.session_state.get("profile_name", "")
+    user_id, saved_profile = session_profile(name) if name.strip() else (None, None)
+    age, gender, activity, diet = (st.session_state.get(key, PROFILE_DEFAULTS[key])
+                                   for key in ("profile_age", "profile_gender", "profile_activity", "profile_diet"))
 
 # ------------------------------
 # WORKOUT PLAN
 # ------------------------------
-with tab_workout:
+MODEL_VIEWER_JS = "https://ajax.googleapis.com/ajax/libs/model-viewer/3.5.0/model-viewer.min.js"
+
+def exercise_viewer(ex, info):
+    # One shared viewer for the whole tab. The model loads only once it
+    # scrolls into view; until then the poster thumbnail is shown.
+    model_url, poster_url = model_assets(info['animation'])
+    poster = f'poster="{poster_url}"' if poster_url else ""
+    st.iframe(f"""
+    <script type="module" src="{MODEL_VIEWER_JS}"></script>
+    <model-viewer src="{model_url}" {poster} alt="{ex}" loading="lazy" reveal="auto"
+        auto-rotate camera-controls ar style="width:100%;height:300px;"></model-viewer>
+    """, height=300)
+
+def mark_done(user_id, ex, seen):
+    # `seen` is how many times the user had done `ex` today when the button
+    # was drawn. A double click or a replayed rerun carries the same value,
+    # so it is recorded once. The write is queued; reads include it at once.
+    try:
+        calories = advisor.record_exercise(user_id, ex, token=seen)
+    except sqlite3.OperationalError as e:
+        st.session_state["workout_notice"] = (ex, f"Could not record {ex}: {e}", False)
+        return
+    st.session_state["workout_notice"] = (ex, f"{ex} marked as done!" if calories is not None
+                                          else f"{ex} was already recorded.", True)
+
+def exercise_card(user_id, ex, info, sets_reps, done_today, notice):
+    st.markdown(f"""
+    <div style='background: linear-gradient(to right,#ff512f,#dd2476); padding:15px; border-radius:15px; box-shadow:2px 2px 10px #000000'>
+        <h3 style='color:#f0f0f0'>{info['emoji']} {ex}</h3>
+        <p style='color:#f0f0f0'><b>Muscles:</b> {info['muscles']}</p>
+        <p style='color:#f0f0f0'><b>Sets x Reps:</b> {sets_reps}</p>
+        <span style='background-color:{level_colors[info['level']]};color:#f0f0f0;padding:5px 10px;border-radius:5px'>{info['level']}</span>
+    </div>
+    """, unsafe_allow_html=True)
+    st.button(f"Mark {ex} as done", key=f"done_{ex}", on_click=mark_done, args=(user_id, ex, done_today[ex]))
+    if notice[0] == ex:
+        (st.success if notice[2] else st.error)(notice[1])
+
+@st.fragment
+@metrics.timed("workout")
+def workout_tab(user_id, age):
     st.header("🏋️ Personalized Workout Plan")
-    if name:
-        group = age_group(age)
-        for ex, info in exercises.items():
-            col1, col2 = st.columns([1,1])
-            with col1:
-                st.markdown(f"""
-                <div style='background: linear-gradient(to right,#ff512f,#dd2476); padding:15px; border-radius:15px; box-shadow:2px 2px 10px #000000'>
-                    <h3 style='color:#f0f0f0'>{info['emoji']} {ex}</h3>
-                    <p style='color:#f0f0f0'><b>Muscles:</b> {info['muscles']}</p>
-                    <p style='color:#f0f0f0'><b>Sets x Reps:</b> {info['sets_reps'][group]}</p>
-                    <span style='background-color:{level_colors[info['level']]};color:#f0f0f0;padding:5px 10px;border-radius:5px'>{info['level']}</span>
-                </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                components.html(f"""
-                <model-viewer src="{info['animation']}" auto-rotate camera-controls ar style="width:100%;height:300px;"></model-viewer>
-                """, height=300)
-            if st.button(f"Mark {ex} as done", key=f"done_{ex}") and name:
-                today = datetime.date.today().isoformat()
-                c.execute("INSERT INTO daily_track (name,exercise,calories,completed,date) VALUES (?,?,?,?,?)",
-                          (name,ex,info['calories'],True,today))
-                conn.commit()
-                st.success(f"{ex} marked as done!")
+    if user_id is None:
+        st.info("Save your profile on the Profile & BMI tab to get started.")
+        return
+    selected = st.selectbox("3D preview", list(exercises), key="viewer_exercise")
+    with metrics.section("workout.viewer"):
+        exercise_viewer(selected, exercises[selected])
+    done_today = collections.Counter(ex for ex, _ in advisor.exercises_on(user_id))
+    notice = st.session_state.pop("workout_notice", (None, None, True))
+    plan = advisor.workout_plan(age)
+    # Today's session from the precomputed program (health_advisor.programs),
+    # one primary-key read; without one, the whole catalog is the plan.
+    today = advisor.program_day(user_id)
+    if today is not None:
+        program, week, session, _ = today
+        st.subheader(f"📅 Week {week['week']} of {len(program['weeks'])}: {week['phase'].title()} "
+                     f"({program['sessions_per_week']} sessions, {program['level']})")
+        planned = {ex: f"{sets}x{reps}" for ex, sets, reps in (session or {}).get("exercises", [])
+                   if ex in exercises}
+        if session is None:
+            upcoming = [from_day_number(week["start_day"] + s["day"]).strftime("%A") for s in week["sessions"]
+                        if week["start_day"] + s["day"] > today_number()]
+            st.info("Rest day." + (f" Next session: {upcoming[0]}." if upcoming else ""))
+        elif program["therapy"]:
+            st.write("Also today: " + ", ".join(program["therapy"]))
+        for ex, sets_reps in planned.items():
+            exercise_card(user_id, ex, exercises[ex], sets_reps, done_today, notice)
+        with st.expander("All exercises"):
+            for ex, info, sets_reps in plan:
+                if ex not in planned:
+                    exercise_card(user_id, ex, info, sets_reps, done_today, notice)
+        return
+    for ex, info, sets_reps in plan:
+        exercise_card(user_id, ex, info, sets_reps, done_today, notice)
+
+if tab_workout.open:
+    with tab_workout:
+        workout_tab(user_id, age)
 
 # ------------------------------
 # DIET PLAN
 # ------------------------------
-with tab_diet:
+@st.fragment
+@metrics.timed("diet")
+def diet_tab(user_id, diet, age, gender, activity):
     st.header("🥗 Personalized Diet Plan")
-    if name:
-        plan, cal_goal, prot_goal = generate_diet_plan(diet, age, gender, activity)
-        st.write(f"Calorie Goal: {cal_goal} kcal/day | Protein Goal: {prot_goal} g/day")
-        for info in plan:
+    if user_id is None:
+        st.info("Save your profile on the Profile & BMI tab to get started.")
+        return
+    plans, cal_goal, prot_goal = advisor.diet_plans(diet, age, gender, activity)
+    st.write(f"Calorie Goal: {cal_goal} kcal/day | Protein Goal: {prot_goal} g/day")
+    if plans:
+        # Start on the option the user's program picked for today.
+        today = advisor.program_day(user_id)
+        option = today[3] if today is not None and today[3] is not None and today[3] < len(plans) else 0
+        choice = st.radio("Plan option", range(len(plans)), index=option, format_func=lambda i: f"Option {i+1}",
+                          horizontal=True, key="diet_plan_option")
+        plan = plans[choice]
+        st.write(f"This plan: {plan.calories} kcal | {plan.protein} g protein")
+        for info in plan.meals:
             st.markdown(f"""
             <div style='background: linear-gradient(to right,#f7971e,#ffd200);padding:10px;margin:5px;border-radius:10px;box-shadow:2px 2px 5px #000000'>
-                {info['emoji']} {info['meal']}: {info['calories']} cal | Protein: {info['protein']}g
+                {info['emoji']} {info['meal']}: {info['name']} - {info['calories']} cal | Protein: {info['protein']}g
             </div>
             """, unsafe_allow_html=True)
 
+if tab_diet.open:
+    with tab_diet:
+        diet_tab(user_id, diet, age, gender, activity)
+
 # ------------------------------
 # PROGRESS TRACKER
 # ------------------------------
-with tab_progress:
+@st.fragment
+@metrics.timed("progress")
+def progress_tab(user_id):
     st.header("📊 Daily & Weekly Progress")
-    if name:
-        today = datetime.date.today().isoformat()
-        c.execute("SELECT exercise, calories FROM daily_track WHERE name=? AND date=? AND completed=1",(name,today))
-        rows = c.fetchall()
-        total_cal = sum([r[1] for r in rows])
-        st.subheader("Daily Tracker")
-        if rows:
-            st.write(f"Exercises completed today: {len(rows)} | Calories burned: {total_cal} kcal")
-            for r in rows: st.write(f"✅ {r[0]} - {r[1]} kcal")
-        else:
-            st.write("No exercises completed today.")
-
-        # Weekly Tracker
-        week_ago = (datetime.date.today() - datetime.timedelta(days=6)).isoformat()
-        c.execute("SELECT date, SUM(calories) as cal_count, COUNT(exercise) as ex_count FROM daily_track WHERE name=? AND date>=? GROUP BY date",(name,week_ago))
-        week_data = c.fetchall()
-        st.subheader("Weekly Tracker")
-        if week_data:
+    if user_id is None:
+        st.info("Save your profile on the Profile & BMI tab to get started.")
+        return
+    today = today_number()
+    view = st.session_state.get("progress_range", next(iter(HISTORY_VIEWS)))
+    # Both are indexed reads (the day's rows and one rollup range), so they
+    # run fresh every time and see writes from the API and bulk imports too.
+    rows, week_data = advisor.exercises_on(user_id, today), advisor.history(user_id, view, today)
+    total_cal = sum([r[1] for r in rows])
+    st.subheader("Daily Tracker")
+    if rows:
+        st.write(f"Exercises completed today: {len(rows)} | Calories burned: {total_cal} kcal")
+        for r in rows: st.write(f"✅ {r[0]} - {r[1]} kcal")
+    else:
+        st.write("No exercises completed today.")
+
+    # Weekly Tracker (and longer views), read from the precomputed rollups
+    st.subheader("Weekly Tracker")
+    st.radio("Range", list(HISTORY_VIEWS), horizontal=True, key="progress_range")
+    if week_data:
+        with metrics.section("progress.charts"):
             df = pd.DataFrame(week_data, columns=["date","calories","exercise_count"])
-            df['date'] = pd.to_datetime(df['date'])
+            df['date'] = pd.to_datetime(df['date'].map(from_day_number))
             line_chart = alt.Chart(df).mark_line(point=True, color="#00FFFF").encode(
                 x=alt.X('date:T', title="Date"),
                 y=alt.Y('calories:Q', title="Calories Burned")
@@ -359,48 +325,108 @@ with tab_progress:
                 y=alt.Y('exercise_count:Q', title="Exercises Completed")
             )
             st.altair_chart(bar_chart,use_container_width=True)
-        else:
-            st.write("No weekly data available. Start completing exercises!")
+    else:
+        st.write(f"No data for the last {view}. Start completing exercises!")
+
+if tab_progress.open:
+    with tab_progress:
+        progress_tab(user_id)
+
+# ------------------------------
+# CONDITION SEARCH
+# ------------------------------
+CONDITION_PAGE_SIZE = 20
+
+def condition_picker(kind, key):
+    # Search runs server-side; only one page of matches is sent to the browser.
+    query = st.text_input("Search conditions", key=f"{key}_query", placeholder="e.g. migraine, stroke rehab")
+    offset = 0
+    total = advisor.search_conditions(kind, query, CONDITION_PAGE_SIZE).total
+    if total > CONDITION_PAGE_SIZE:
+        pages = -(-total // CONDITION_PAGE_SIZE)
+        offset = (st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page") - 1) * CONDITION_PAGE_SIZE
+    results = advisor.search_conditions(kind, query, CONDITION_PAGE_SIZE, offset)
+    if not results.names:
+        st.write("No matching conditions.")
+        return None
+    return st.selectbox(f"Select Your Medical Condition ({total} matches)", results.names, key=key)
 
 # ------------------------------
 # MEDICAL EXERCISES
 # ------------------------------
-with tab_med_exercise:
+@st.fragment
+@metrics.timed("medical_exercises")
+def medical_exercise_tab():
     st.header("🏥 Medical Exercise Advice")
-    condition_ex = st.selectbox(
-        "Select Your Medical Condition",
-        list(medical_exercises.keys()),
-        key="med_ex_condition"
-    )
+    condition_ex = condition_picker("medical_exercises", "med_ex_condition")
     if condition_ex:
         st.subheader(f"Recommended Exercises for {condition_ex}")
-        for ex in medical_exercises[condition_ex]:
+        for ex in advisor.medical_exercises(condition_ex):
             st.write(f"✅ {ex}")
 
+if tab_med_exercise.open:
+    with tab_med_exercise:
+        medical_exercise_tab()
+
 # ------------------------------
 # MEDICAL DIET
 # ------------------------------
-with tab_med_diet:
+@st.fragment
+@metrics.timed("medical_diet")
+def medical_diet_tab():
     st.header("🥗 Medical Diet Advice")
-    condition_diet = st.selectbox(
-        "Select Your Medical Condition",
-        list(medical_diet.keys()),
-        key="med_diet_condition"
-    )
+    condition_diet = condition_picker("medical_diet", "med_diet_condition")
     if condition_diet:
+        advice = advisor.medical_diet(condition_diet)
         st.subheader(f"What to Eat for {condition_diet}")
-        for food in medical_diet[condition_diet]["eat"]:
+        for food in advice["eat"]:
             st.write(f"✅ {food}")
         st.subheader(f"What to Avoid for {condition_diet}")
-        for food in medical_diet[condition_diet]["avoid"]:
+        for food in advice["avoid"]:
             st.write(f"❌ {food}")
 
+if tab_med_diet.open:
+    with tab_med_diet:
+        medical_diet_tab()
+
+# ------------------------------
+# ADMIN (only with metrics on and ?admin=<HEALTH_ADVISOR_ADMIN_TOKEN>)
+# ------------------------------
+@st.fragment
+def admin_tab():
+    st.header("⚙️ Performance")
+    rows = []
+    for name, labels, hist in metrics.registry.snapshot():
+        rows.append({"metric": name.removeprefix("health_advisor_"), "series": ", ".join(labels.values()),
+                     "count": hist.count, "mean": hist.total / hist.count if hist.count else None,
+                     "p50 ≤": hist.quantile(0.5), "p95 ≤": hist.quantile(0.95), "p99 ≤": hist.quantile(0.99)})
+    if rows:
+        st.caption("Seconds for *_seconds metrics, rows for sql_rows; quantiles are histogram bucket bounds.")
+        st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+    else:
+        st.write("Nothing recorded yet.")
+    st.subheader(f"Slow statements (≥ {metrics.SLOW_QUERY_MS:g} ms)")
+    for q in list(metrics.registry.slow_queries)[:20]:
+        with st.expander(f"{q['ms']} ms · {q['rows']} rows · {q['sql'][:80]}"):
+            st.code(q["sql"], language="sql")
+            st.code(q["plan"])
+    col1, col2 = st.columns(2)
+    col1.download_button("Download Prometheus metrics", metrics.prometheus_text(), "metrics.txt", "text/plain")
+    if col2.button("Reset", key="admin_reset"):
+        metrics.registry.reset()
+        st.rerun(scope="fragment")
+
+if show_admin and tabs[6].open:
+    with tabs[6]:
+        admin_tab()
+
 # ------------------------------
 # ABOUT DEVELOPER
 # ------------------------------
-st.markdown("<hr style='border:2px solid #0072ff'>", unsafe_allow_html=True)
-st.header("👨‍💻 About Developer")
-st.markdown("""
+with metrics.section("about"):
+    st.markdown("<hr style='border:2px solid #0072ff'>", unsafe_allow_html=True)
+    st.header("👨‍💻 About Developer")
+    st.markdown("""
 <div style='background: linear-gradient(to right,#1e3c72,#2a5298);padding:15px;border-radius:10px;box-shadow:2px 2px 10px #000000; color:#f0f0f0'>
 <b>Name:</b> Gautam Lal Yadav <br>
 <b>GitHub:</b> <a href='https://github.com/YourUsername' style='color:#00FFFF'>github.com/YourUsername</a> <br>
@@ -409,4 +435,4 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-st.success("Your personalized health dashboard with BMI, diet, workouts, medical guidance, and weekly tracking is ready! 🎉")
+    st.success("Your personalized health dashboard with BMI, diet, workouts, medical guidance, and weekly tracking is ready! 🎉")
@@ -0,0 +1,73 @@
+"""Offline asset pipeline for the Workout Plan 3D viewer.
+
+For every exercise in data/catalog.json this compresses the source model
+(the catalog's ``animation`` path, e.g. animations/pushup.glb) with
+gltf-transform (meshopt geometry, WebP textures), renders a poster thumbnail
+with screenshot-glb, and writes both to static/models/ together with
+manifest.json. Both tools run through npx, so Node.js must be installed:
+
+    python tools/build_assets.py
+
+Only assets whose source changed since the last run are rebuilt.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from health_advisor.assets import MANIFEST_PATH, STATIC_DIR  # noqa: E402
+from health_advisor.catalog import CatalogStore  # noqa: E402
+
+OUT_DIR = os.path.dirname(MANIFEST_PATH)
+URL_PREFIX = "app/static/models/"
+
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def _run(*cmd):
+    print("+", " ".join(cmd))
+    subprocess.run(cmd, check=True)
+
+
+def build():
+    os.makedirs(OUT_DIR, exist_ok=True)
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    catalog = CatalogStore().current()
+    for ex, info in catalog.exercises.items():
+        source = info["animation"]
+        source_path = os.path.join(ROOT, source)
+        if not os.path.exists(source_path):
+            print(f"skip {ex}: {source} not found")
+            continue
+        source_hash = _digest(source_path)
+        if manifest.get(source, {}).get("source") == source_hash:
+            continue
+        stem = os.path.splitext(os.path.basename(source))[0]
+        model = os.path.join(OUT_DIR, f"{stem}.glb")
+        poster = os.path.join(OUT_DIR, f"{stem}.png")
+        _run("npx", "--yes", "@gltf-transform/cli", "optimize", source_path, model,
+             "--compress", "meshopt", "--texture-compress", "webp")
+        _run("npx", "--yes", "@shopify/screenshot-glb", "-i", model, "-o", poster)
+        manifest[source] = {
+            "source": source_hash,
+            "model": f"{URL_PREFIX}{stem}.glb?v={_digest(model)}",
+            "poster": f"{URL_PREFIX}{stem}.png?v={_digest(poster)}",
+        }
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"wrote {os.path.relpath(MANIFEST_PATH, STATIC_DIR)} ({len(manifest)} models)")
+
+
+if __name__ == '__main__':
+    build()